@@ -4,11 +4,13 @@
 Проверяет все критические компоненты перед развертыванием
 """
 
+import io
+import mmap
 import os
 import sys
 import importlib.util
-from pathlib import Path
-from typing import List, Tuple, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, Dict, Any, Callable, Final, Optional, TextIO
 import traceback
 
 # Цвета для консоли
@@ -20,42 +22,159 @@ class Colors:
     BOLD = '\033[1m'
     END = '\033[0m'
 
-def print_status(message: str, status: str = "INFO"):
+def print_status(message: str, status: str = "INFO", file: Optional[TextIO] = None):
     """Печать статуса с цветами"""
     color = Colors.GREEN if status == "OK" else Colors.RED if status == "ERROR" else Colors.YELLOW
-    print(f"{color}[{status}]{Colors.END} {message}")
+    print(f"{color}[{status}]{Colors.END} {message}", file=file)
 
-def print_header(message: str):
+def print_header(message: str, file: Optional[TextIO] = None):
     """Печать заголовка"""
-    print(f"\n{Colors.BOLD}{Colors.BLUE}=== {message} ==={Colors.END}")
+    print(f"\n{Colors.BOLD}{Colors.BLUE}=== {message} ==={Colors.END}", file=file)
+
+# Имена пакетов, у которых имя модуля для импорта отличается
+MODULE_IMPORT_NAMES = {
+    "pillow": "PIL",
+}
+
+def find_module(name: str) -> bool:
+    """Проверить доступность модуля без выполнения его кода"""
+    try:
+        return importlib.util.find_spec(MODULE_IMPORT_NAMES.get(name, name)) is not None
+    except (ImportError, ValueError):
+        return False
+
+# Списки проверок; модули хранятся отсортированными без дубликатов
+REQUIRED_FILES: Final = (
+    "main.py",
+    "config.py",
+    "database.py",
+    "models.py",
+    "utils.py",
+    "requirements-prod.txt",
+    "env.example",
+    "deploy.sh",
+    "start_server.sh",
+    "DEPLOY_GUIDE.md",
+)
+
+REQUIRED_DIRS: Final = (
+    "handlers",
+    "services",
+    "tests",
+    "handlers/admin",
+    "handlers/common",
+    "handlers/profile",
+    "handlers/natal_chart",
+    "handlers/predictions",
+    "handlers/compatibility",
+    "handlers/star_advice",
+    "handlers/sky_map",
+    "handlers/subscription",
+)
+
+CRITICAL_MODULES: Final = tuple(sorted(frozenset({
+    "aiogram",
+    "sqlalchemy",
+    "swisseph",
+    "geopy",
+    "matplotlib",
+    "numpy",
+    "scipy",
+    "pillow",
+    "dotenv",
+    "aiohttp",
+    "aiosqlite",
+    "apscheduler",
+    "skyfield",
+    "openai",
+    "timezonefinder",
+})))
+
+SERVICES: Final = tuple(sorted(frozenset({
+    "services.astro_calculations",
+    "services.subscription_service",
+    "services.ai_predictions",
+    "services.geocoding_service",
+    "services.sky_visualization_service",
+})))
+
+HANDLERS: Final = tuple(sorted(frozenset({
+    "handlers.admin.router",
+    "handlers.common.router",
+    "handlers.profile.router",
+    "handlers.natal_chart.router",
+    "handlers.predictions.router",
+    "handlers.compatibility.router",
+    "handlers.star_advice.router",
+    "handlers.sky_map.router",
+    "handlers.subscription.router",
+})))
+
+EPHEMERIS_FILES: Final = (
+    "de421.bsp",
+    "de422.bsp",
+)
+
+EXECUTABLE_FILES: Final = (
+    "deploy.sh",
+    "start_server.sh",
+)
 
 class DeployChecker:
     """Класс для проверки готовности к деплою"""
     
-    def __init__(self):
+    def __init__(self, buffered: bool = True):
+        # В буферизованном режиме вывод каждой фазы пишется в stdout одним вызовом
+        self.buffered = buffered
         self.errors = []
         self.warnings = []
         self.checks_passed = 0
         self.checks_total = 0
+        self._files = None
+        self._dirs = None
+        self._entries = {}
+        # Поток вывода; у параллельных проверок свой буфер, чтобы вывод не перемешивался
+        self._out = None
+
+    def _scan_once(self, roots: Tuple[str, ...] = (".", "handlers", "services")):
+        """Один проход os.scandir по корням проекта вместо stat на каждый файл"""
+        if self._files is not None:
+            return
+
+        # Тип записи берется из d_type, который getdents уже вернул: без лишних stat
+        self._files = set()
+        self._dirs = set()
+        for root in roots:
+            try:
+                with os.scandir(root) as it:
+                    for entry in it:
+                        key = entry.name if root == "." else f"{root}/{entry.name}"
+                        if entry.is_dir():
+                            self._dirs.add(key)
+                        elif entry.is_file():
+                            self._files.add(key)
+                        self._entries[key] = entry
+            except OSError:
+                continue
     
     def add_error(self, message: str):
         """Добавить ошибку"""
         self.errors.append(message)
-        print_status(message, "ERROR")
+        print_status(message, "ERROR", file=self._out)
     
     def add_warning(self, message: str):
         """Добавить предупреждение"""
         self.warnings.append(message)
-        print_status(message, "WARN")
+        print_status(message, "WARN", file=self._out)
     
     def add_success(self, message: str):
         """Добавить успешную проверку"""
         self.checks_passed += 1
-        print_status(message, "OK")
+        print_status(message, "OK", file=self._out)
     
     def check_python_version(self) -> bool:
         """Проверка версии Python"""
-        print_header("Проверка Python")
+        print_header("Проверка Python", file=self._out)
         self.checks_total += 1
         
         version = sys.version_info
@@ -68,25 +187,13 @@ class DeployChecker:
     
     def check_required_files(self) -> bool:
         """Проверка обязательных файлов"""
-        print_header("Проверка файлов")
-        
-        required_files = [
-            "main.py",
-            "config.py", 
-            "database.py",
-            "models.py",
-            "utils.py",
-            "requirements-prod.txt",
-            "env.example",
-            "deploy.sh",
-            "start_server.sh",
-            "DEPLOY_GUIDE.md"
-        ]
+        print_header("Проверка файлов", file=self._out)
         
+        self._scan_once()
         all_good = True
-        for file in required_files:
+        for file in REQUIRED_FILES:
             self.checks_total += 1
-            if Path(file).exists():
+            if file in self._files:
                 self.add_success(f"Файл {file} найден")
             else:
                 self.add_error(f"Файл {file} отсутствует")
@@ -96,27 +203,13 @@ class DeployChecker:
     
     def check_directories(self) -> bool:
         """Проверка директорий"""
-        print_header("Проверка директорий")
-        
-        required_dirs = [
-            "handlers",
-            "services", 
-            "tests",
-            "handlers/admin",
-            "handlers/common",
-            "handlers/profile",
-            "handlers/natal_chart",
-            "handlers/predictions",
-            "handlers/compatibility",
-            "handlers/star_advice",
-            "handlers/sky_map",
-            "handlers/subscription"
-        ]
+        print_header("Проверка директорий", file=self._out)
         
+        self._scan_once()
         all_good = True
-        for dir_path in required_dirs:
+        for dir_path in REQUIRED_DIRS:
             self.checks_total += 1
-            if Path(dir_path).exists():
+            if dir_path in self._dirs:
                 self.add_success(f"Директория {dir_path} найдена")
             else:
                 self.add_error(f"Директория {dir_path} отсутствует")
@@ -126,38 +219,14 @@ class DeployChecker:
     
     def check_imports(self) -> bool:
         """Проверка импортов"""
-        print_header("Проверка импортов")
-        
-        critical_modules = [
-            "aiogram",
-            "sqlalchemy", 
-            "swisseph",
-            "geopy",
-            "matplotlib",
-            "numpy",
-            "scipy",
-            "pillow",
-            "dotenv",
-            "aiohttp",
-            "aiosqlite",
-            "apscheduler",
-            "skyfield",
-            "openai",
-            "timezonefinder"
-        ]
+        print_header("Проверка импортов", file=self._out)
         
         all_good = True
-        for module in critical_modules:
+        for module in CRITICAL_MODULES:
             self.checks_total += 1
-            try:
-                if module == "pillow":
-                    import PIL
-                elif module == "dotenv":
-                    import dotenv
-                else:
-                    __import__(module)
+            if find_module(module):
                 self.add_success(f"Модуль {module} доступен")
-            except ImportError:
+            else:
                 self.add_error(f"Модуль {module} не найден")
                 all_good = False
         
@@ -165,7 +234,7 @@ class DeployChecker:
     
     def check_config(self) -> bool:
         """Проверка конфигурации"""
-        print_header("Проверка конфигурации")
+        print_header("Проверка конфигурации", file=self._out)
         
         try:
             # Проверяем импорт config
@@ -175,13 +244,10 @@ class DeployChecker:
             
             # Проверяем .env файл
             self.checks_total += 1
-            if Path(".env").exists():
+            if os.path.exists(".env"):
                 self.add_success("Файл .env найден")
                 
-                # Проверяем критические переменные
-                from dotenv import load_dotenv
-                load_dotenv()
-                
+                # Проверяем критические переменные (.env уже загружен при импорте config)
                 critical_vars = ["BOT_TOKEN", "ADMIN_IDS"]
                 for var in critical_vars:
                     self.checks_total += 1
@@ -211,7 +277,7 @@ class DeployChecker:
     
     def check_database(self) -> bool:
         """Проверка базы данных"""
-        print_header("Проверка базы данных")
+        print_header("Проверка базы данных", file=self._out)
         
         try:
             self.checks_total += 1
@@ -224,10 +290,13 @@ class DeployChecker:
                 db_manager = DatabaseManager("sqlite:///test_deploy.db")
                 self.add_success("DatabaseManager создан")
                 
-                # Удаляем тестовую БД
-                test_db = Path("test_deploy.db")
-                if test_db.exists():
-                    test_db.unlink()
+                # Закрываем соединения и удаляем тестовую БД вместе с файлами WAL
+                db_manager.engine.dispose()
+                for path in ("test_deploy.db", "test_deploy.db-wal", "test_deploy.db-shm"):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
                     
             except Exception as e:
                 self.add_error(f"Ошибка создания DatabaseManager: {e}")
@@ -241,69 +310,43 @@ class DeployChecker:
     
     def check_services(self) -> bool:
         """Проверка сервисов"""
-        print_header("Проверка сервисов")
-        
-        services = [
-            "services.astro_calculations",
-            "services.subscription_service",
-            "services.ai_predictions",
-            "services.geocoding_service",
-            "services.sky_visualization_service"
-        ]
+        print_header("Проверка сервисов", file=self._out)
         
         all_good = True
-        for service in services:
+        for service in SERVICES:
             self.checks_total += 1
-            try:
-                __import__(service)
+            if find_module(service):
                 self.add_success(f"Сервис {service} доступен")
-            except ImportError as e:
-                self.add_error(f"Сервис {service} не найден: {e}")
+            else:
+                self.add_error(f"Сервис {service} не найден")
                 all_good = False
         
         return all_good
     
     def check_handlers(self) -> bool:
         """Проверка обработчиков"""
-        print_header("Проверка обработчиков")
-        
-        handlers = [
-            "handlers.admin.router",
-            "handlers.common.router",
-            "handlers.profile.router",
-            "handlers.natal_chart.router",
-            "handlers.predictions.router",
-            "handlers.compatibility.router",
-            "handlers.star_advice.router",
-            "handlers.sky_map.router",
-            "handlers.subscription.router"
-        ]
+        print_header("Проверка обработчиков", file=self._out)
         
         all_good = True
-        for handler in handlers:
+        for handler in HANDLERS:
             self.checks_total += 1
-            try:
-                __import__(handler)
+            if find_module(handler):
                 self.add_success(f"Обработчик {handler} доступен")
-            except ImportError as e:
-                self.add_error(f"Обработчик {handler} не найден: {e}")
+            else:
+                self.add_error(f"Обработчик {handler} не найден")
                 all_good = False
         
         return all_good
     
     def check_ephemeris_files(self) -> bool:
         """Проверка файлов эфемерид"""
-        print_header("Проверка файлов эфемерид")
-        
-        ephemeris_files = [
-            "de421.bsp",
-            "de422.bsp"
-        ]
+        print_header("Проверка файлов эфемерид", file=self._out)
         
+        self._scan_once()
         found_files = []
-        for file in ephemeris_files:
+        for file in EPHEMERIS_FILES:
             self.checks_total += 1
-            if Path(file).exists():
+            if file in self._files:
                 self.add_success(f"Файл эфемерид {file} найден")
                 found_files.append(file)
             else:
@@ -316,19 +359,16 @@ class DeployChecker:
     
     def check_permissions(self) -> bool:
         """Проверка прав доступа"""
-        print_header("Проверка прав доступа")
-        
-        executable_files = [
-            "deploy.sh",
-            "start_server.sh"
-        ]
+        print_header("Проверка прав доступа", file=self._out)
         
+        self._scan_once()
         all_good = True
-        for file in executable_files:
+        for file in EXECUTABLE_FILES:
             self.checks_total += 1
-            file_path = Path(file)
-            if file_path.exists():
-                if os.access(file_path, os.X_OK):
+            entry = self._entries.get(file)
+            if entry is not None:
+                # DirEntry кэширует результат stat, повторного вызова не будет
+                if entry.stat().st_mode & 0o111:
                     self.add_success(f"Файл {file} исполняемый")
                 else:
                     self.add_warning(f"Файл {file} не исполняемый (chmod +x {file})")
@@ -340,15 +380,17 @@ class DeployChecker:
     
     def check_security(self) -> bool:
         """Проверка безопасности"""
-        print_header("Проверка безопасности")
+        print_header("Проверка безопасности", file=self._out)
         
         security_checks = []
         
         # Проверка .env файла
         self.checks_total += 1
-        env_file = Path(".env")
-        if env_file.exists():
-            stat = env_file.stat()
+        try:
+            stat = os.stat(".env")
+        except FileNotFoundError:
+            stat = None
+        if stat is not None:
             if stat.st_mode & 0o077:  # Проверяем права доступа
                 self.add_warning("Файл .env доступен для чтения другими пользователями")
             else:
@@ -357,9 +399,9 @@ class DeployChecker:
         # Проверка наличия секретных ключей в коде
         self.checks_total += 1
         try:
-            with open("config.py", "r", encoding="utf-8") as f:
-                content = f.read()
-                if "your-secret-key-change-me" in content:
+            # Ищем байты напрямую в отображенном файле, без чтения и декодирования
+            with open("config.py", "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if mm.find(b"your-secret-key-change-me") != -1:
                     self.add_warning("Используется дефолтный SECRET_KEY")
                 else:
                     self.add_success("SECRET_KEY изменен")
@@ -372,13 +414,22 @@ class DeployChecker:
         """Запуск всех проверок"""
         print(f"{Colors.BOLD}{Colors.BLUE}🔍 Проверка готовности SolarBalance к деплою{Colors.END}\n")
         
-        checks = [
+        # Блокирующие проверки: при их провале остальные фазы не имеют смысла
+        gating_checks = [
             self.check_python_version,
             self.check_required_files,
+        ]
+        
+        # Зависимые проверки выполняются последовательно
+        serial_checks = [
             self.check_directories,
-            self.check_imports,
             self.check_config,
             self.check_database,
+        ]
+        
+        # Независимые проверки (stat и поиск модулей) выполняются параллельно
+        parallel_checks = [
+            self.check_imports,
             self.check_services,
             self.check_handlers,
             self.check_ephemeris_files,
@@ -386,45 +437,93 @@ class DeployChecker:
             self.check_security
         ]
         
-        for check in checks:
-            try:
-                check()
-            except Exception as e:
-                self.add_error(f"Ошибка при выполнении проверки {check.__name__}: {e}")
-                print(f"Полная ошибка: {traceback.format_exc()}")
+        self._scan_once()
+        
+        for check in gating_checks:
+            if not self._run_phase(check):
+                print_status("Дальнейшие проверки пропущены из-за критической ошибки", "WARN")
+                return self.print_summary()
+        
+        for check in serial_checks:
+            self._run_phase(check)
+        
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for worker, _ in executor.map(self._run_isolated, parallel_checks):
+                self._merge(worker)
         
         return self.print_summary()
     
+    def _run_check(self, check: Callable[[], bool]) -> bool:
+        """Выполнить проверку, перехватив непредвиденные ошибки"""
+        try:
+            return check()
+        except Exception as e:
+            self.add_error(f"Ошибка при выполнении проверки {check.__name__}: {e}")
+            print(f"Полная ошибка: {traceback.format_exc()}", file=self._out)
+            return False
+    
+    def _run_phase(self, check: Callable[[], bool]) -> bool:
+        """Выполнить последовательную проверку с учетом режима буферизации"""
+        if not self.buffered:
+            return self._run_check(check)
+        
+        worker, result = self._run_isolated(check)
+        self._merge(worker)
+        return result
+    
+    def _run_isolated(self, check: Callable[[], bool]) -> Tuple["DeployChecker", bool]:
+        """Выполнить проверку на отдельном экземпляре с буферизованным выводом"""
+        worker = DeployChecker()
+        worker._files = self._files
+        worker._dirs = self._dirs
+        worker._entries = self._entries
+        worker._out = io.StringIO()
+        result = worker._run_check(getattr(worker, check.__name__))
+        return worker, result
+    
+    def _merge(self, worker: "DeployChecker"):
+        """Объединить результаты и вывод проверки, выполненной в отдельном потоке"""
+        self.errors.extend(worker.errors)
+        self.warnings.extend(worker.warnings)
+        self.checks_passed += worker.checks_passed
+        self.checks_total += worker.checks_total
+        sys.stdout.write(worker._out.getvalue())
+    
     def print_summary(self) -> bool:
         """Печать итогового отчета"""
-        print_header("Итоговый отчет")
+        out = io.StringIO() if self.buffered else None
+        print_header("Итоговый отчет", file=out)
         
-        print(f"✅ Проверок пройдено: {self.checks_passed}/{self.checks_total}")
+        print(f"✅ Проверок пройдено: {self.checks_passed}/{self.checks_total}", file=out)
         
         if self.errors:
-            print(f"\n{Colors.RED}❌ КРИТИЧЕСКИЕ ОШИБКИ ({len(self.errors)}):{Colors.END}")
+            print(f"\n{Colors.RED}❌ КРИТИЧЕСКИЕ ОШИБКИ ({len(self.errors)}):{Colors.END}", file=out)
             for error in self.errors:
-                print(f"  • {error}")
+                print(f"  • {error}", file=out)
         
         if self.warnings:
-            print(f"\n{Colors.YELLOW}⚠️  ПРЕДУПРЕЖДЕНИЯ ({len(self.warnings)}):{Colors.END}")
+            print(f"\n{Colors.YELLOW}⚠️  ПРЕДУПРЕЖДЕНИЯ ({len(self.warnings)}):{Colors.END}", file=out)
             for warning in self.warnings:
-                print(f"  • {warning}")
+                print(f"  • {warning}", file=out)
         
         success_rate = (self.checks_passed / self.checks_total) * 100 if self.checks_total > 0 else 0
         
-        print(f"\n{Colors.BOLD}Готовность к деплою: {success_rate:.1f}%{Colors.END}")
+        print(f"\n{Colors.BOLD}Готовность к деплою: {success_rate:.1f}%{Colors.END}", file=out)
         
         if not self.errors:
-            print(f"\n{Colors.GREEN}🎉 Готов к деплою! Запустите: ./deploy.sh{Colors.END}")
-            return True
+            print(f"\n{Colors.GREEN}🎉 Готов к деплою! Запустите: ./deploy.sh{Colors.END}", file=out)
         else:
-            print(f"\n{Colors.RED}❌ Не готов к деплою. Исправьте ошибки выше.{Colors.END}")
-            return False
+            print(f"\n{Colors.RED}❌ Не готов к деплою. Исправьте ошибки выше.{Colors.END}", file=out)
+        
+        if out is not None:
+            sys.stdout.write(out.getvalue())
+        
+        return not self.errors
 
 def main():
     """Основная функция"""
-    checker = DeployChecker()
+    # --live: печатать результаты сразу, без буферизации по фазам
+    checker = DeployChecker(buffered="--live" not in sys.argv[1:])
     
     try:
         success = checker.run_all_checks()
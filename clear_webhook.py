@@ -4,19 +4,24 @@
 """
 
 import asyncio
-from aiogram import Bot
+import aiohttp
 from config import Config
 
+TELEGRAM_API_URL = "https://api.telegram.org/bot{token}/{method}"
+
 async def clear_webhook():
     """Очистить webhook и pending updates"""
-    bot = Bot(Config.BOT_TOKEN)
+    url = TELEGRAM_API_URL.format(token=Config.BOT_TOKEN, method="deleteWebhook")
     try:
-        await bot.delete_webhook(drop_pending_updates=True)
-        print("✅ Webhook очищен и pending updates удалены")
+        async with aiohttp.ClientSession() as session:
+            async with session.post(url, json={"drop_pending_updates": True}) as response:
+                result = await response.json()
+        if result.get("ok"):
+            print("✅ Webhook очищен и pending updates удалены")
+        else:
+            print(f"❌ Ошибка при очистке webhook: {result.get('description')}")
     except Exception as e:
         print(f"❌ Ошибка при очистке webhook: {e}")
-    finally:
-        await bot.session.close()
 
 if __name__ == "__main__":
-    asyncio.run(clear_webhook()) 
\ No newline at end of file
+    asyncio.run(clear_webhook())
\ No newline at end of file
@@ -1,21 +1,31 @@
 import os
-from typing import Optional
+import sys
+from types import MappingProxyType
+from typing import Optional, Tuple
+from urllib.parse import urlsplit
 
 from dotenv import load_dotenv
 
-load_dotenv()
+# .env читается один раз за процесс, даже при повторной загрузке модуля
+if not globals().get("_ENV_LOADED", False):
+    load_dotenv(override=False)
+    _ENV_LOADED = True
+
+# Снимок окружения: class body читает его один раз вместо os.getenv на каждый ключ
+_ENV = dict(os.environ)
+_get = _ENV.get
 
 
 class Config:
     """Конфигурация приложения"""
 
     # === TELEGRAM ===
-    BOT_TOKEN = os.getenv("BOT_TOKEN")
+    BOT_TOKEN = _get("BOT_TOKEN")
     if not BOT_TOKEN:
         raise ValueError("BOT_TOKEN не найден в переменных окружения")
     
     # === ADMIN ===
-    ADMIN_IDS_STR = os.getenv("ADMIN_IDS", "")
+    ADMIN_IDS_STR = _get("ADMIN_IDS", "")
     ADMIN_IDS = []
     if ADMIN_IDS_STR:
         try:
@@ -25,54 +35,51 @@ class Config:
             ADMIN_IDS = []
 
     # === AI ===
-    AI_API = os.getenv("AI_API")
-    AI_REQUEST_TIMEOUT = int(os.getenv("AI_REQUEST_TIMEOUT", "30"))
-    AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", "3"))
+    AI_API = _get("AI_API")
+    AI_REQUEST_TIMEOUT = int(_get("AI_REQUEST_TIMEOUT", "30"))
+    AI_MAX_RETRIES = int(_get("AI_MAX_RETRIES", "3"))
 
     # === DATABASE ===
     # Поддержка как SQLite для разработки, так и PostgreSQL для продакшена
-    DATABASE_URL = os.getenv("DATABASE_URL")
+    DATABASE_URL = _get("DATABASE_URL")
     
     # Если DATABASE_URL не указан, используем SQLite для разработки
     if not DATABASE_URL:
         DATABASE_URL = "sqlite+aiosqlite:///solarbalance.db"
-        print("⚠️ DATABASE_URL не указан, используется SQLite для разработки")
-    
-    # Определяем тип БД по URL
-    IS_POSTGRESQL = DATABASE_URL.startswith(("postgresql://", "postgres://"))
-    IS_SQLITE = DATABASE_URL.startswith("sqlite")
     
-    if IS_POSTGRESQL:
-        print("✅ Используется PostgreSQL")
-    elif IS_SQLITE:
-        print("✅ Используется SQLite (разработка)")
-    else:
-        print("⚠️ Неизвестный тип БД, проверьте DATABASE_URL")
+    # Определяем тип БД по схеме URL (драйвер после "+" не учитываем)
+    DATABASE_DIALECT = urlsplit(DATABASE_URL).scheme.lower().partition("+")[0]
+    IS_POSTGRESQL = DATABASE_DIALECT in ("postgresql", "postgres")
+    IS_SQLITE = DATABASE_DIALECT == "sqlite"
 
     # === SWISS EPHEMERIS ===
-    EPHEMERIS_PATH = os.getenv("EPHEMERIS_PATH", ".")
+    EPHEMERIS_PATH = _get("EPHEMERIS_PATH", ".")
 
     # === ZODIAC SIGNS ===
-    ZODIAC_SIGNS = [
+    ZODIAC_SIGNS: Tuple[str, ...] = tuple(map(sys.intern, (
         "Овен", "Телец", "Близнецы", "Рак", "Лев", "Дева",
         "Весы", "Скорпион", "Стрелец", "Козерог", "Водолей", "Рыбы"
-    ]
+    )))
+
+    # === DATE FORMATS ===
+    DATE_TIME_FORMATS = ("%d.%m.%Y %H:%M", "%d/%m/%Y %H:%M", "%Y-%m-%d %H:%M")
+    DATE_ONLY_FORMATS = ("%d.%m.%Y", "%d/%m/%Y", "%Y-%m-%d")
 
     # === SUBSCRIPTION LIMITS ===
-    FREE_USER_LIMITS = {
+    FREE_USER_LIMITS = MappingProxyType({
         "natal_charts": 3,
         "questions_per_day": 5,
-        "planets": ["Солнце", "Луна", "Асцендент"]
-    }
+        "planets": ("Солнце", "Луна", "Асцендент")
+    })
 
-    PREMIUM_USER_LIMITS = {
+    PREMIUM_USER_LIMITS = MappingProxyType({
         "natal_charts": -1,  # Безлимитно
         "questions_per_day": -1,  # Безлимитно
-        "planets": [
+        "planets": (
             "Солнце", "Луна", "Асцендент", "Меркурий", "Венера", "Марс",
             "Юпитер", "Сатурн", "Уран", "Нептун", "Плутон"
-        ]
-    }
+        )
+    })
 
     # === ANTI-SPAM ===
     ANTI_SPAM_CONFIG = {
@@ -82,24 +89,28 @@ class Config:
     }
 
     # === LOGGING ===
-    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_LEVEL = _get("LOG_LEVEL", "INFO")
     LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 
     # === ENVIRONMENT ===
-    ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
+    ENVIRONMENT = _get("ENVIRONMENT", "development")
     IS_PRODUCTION = ENVIRONMENT.lower() == "production"
     IS_DEVELOPMENT = ENVIRONMENT.lower() == "development"
 
     # === PERFORMANCE ===
     # Настройки для PostgreSQL
     POSTGRESQL_CONFIG = {
-        "pool_size": int(os.getenv("POSTGRESQL_POOL_SIZE", "20")),
-        "max_overflow": int(os.getenv("POSTGRESQL_MAX_OVERFLOW", "30")),
+        "pool_size": int(_get("POSTGRESQL_POOL_SIZE", "20")),
+        "max_overflow": int(_get("POSTGRESQL_MAX_OVERFLOW", "30")),
         "pool_pre_ping": True,
-        "pool_recycle": int(os.getenv("POSTGRESQL_POOL_RECYCLE", "3600")),
-        "echo": os.getenv("POSTGRESQL_ECHO", "false").lower() == "true",
+        "pool_recycle": int(_get("POSTGRESQL_POOL_RECYCLE", "3600")),
+        "echo": _get("POSTGRESQL_ECHO", "false").lower() == "true",
     }
 
+    # Запрет ленивых загрузок (raiseload) в async-запросах пользователей:
+    # скрытый N+1 падает сразу; DB_STRICT_LOADING=false отключает в продакшене
+    DB_STRICT_LOADING = _get("DB_STRICT_LOADING", "true").lower() == "true"
+
     # Настройки для SQLite
     SQLITE_CONFIG = {
         "pool_pre_ping": True,
@@ -149,7 +160,12 @@ class Config:
         print("=" * 40)
         print(f"🌍 Окружение: {cls.ENVIRONMENT}")
         print(f"🤖 AI API: {'✅ Настроен' if cls.AI_API else '❌ Не настроен'}")
-        print(f"🗄️ База данных: {'PostgreSQL' if cls.IS_POSTGRESQL else 'SQLite'}")
+        if cls.IS_POSTGRESQL:
+            print("🗄️ База данных: PostgreSQL")
+        elif cls.IS_SQLITE:
+            print("🗄️ База данных: SQLite (разработка)")
+        else:
+            print("🗄️ База данных: ⚠️ неизвестный тип, проверьте DATABASE_URL")
         print(f"🔧 Режим: {'Продакшен' if cls.IS_PRODUCTION else 'Разработка'}")
         
         if cls.IS_POSTGRESQL:
@@ -158,10 +174,10 @@ class Config:
         
         print("=" * 40)
 
+    @classmethod
+    def bootstrap(cls):
+        """Проверить конфигурацию и вывести сводку (вызывается при запуске бота)"""
+        if not cls.validate_config():
+            raise RuntimeError("Некорректная конфигурация")
 
-# Валидация конфигурации при импорте
-if not Config.validate_config():
-    raise RuntimeError("Некорректная конфигурация")
-
-# Вывод сводки конфигурации
-Config.print_config_summary()
+        cls.print_config_summary()
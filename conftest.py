@@ -3,44 +3,134 @@
 Содержит общие фикстуры и настройки для асинхронных тестов.
 """
 
+from __future__ import annotations
+
 import asyncio
+import re
 from datetime import datetime
-from typing import AsyncGenerator
+from types import MappingProxyType
+from typing import TYPE_CHECKING, AsyncGenerator, List
 from unittest.mock import AsyncMock, Mock
 
 import pytest
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+import pytest_asyncio
+
+# SQLAlchemy и модели импортируются лениво в фикстурах, чтобы не замедлять сбор тестов
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
 
-from database_async import AsyncDatabaseManager, Base, NatalChart, Subscription, User
+    from database_async import AsyncDatabaseManager, NatalChart, User
 
 
 @pytest.fixture(scope="session")
-def event_loop():
-    """Создает event loop для всей сессии тестирования"""
-    loop = asyncio.new_event_loop()
-    yield loop
-    loop.close()
+def event_loop_policy():
+    """Политика event loop для всей сессии: uvloop, если установлен (на Windows его нет)"""
+    try:
+        import uvloop
+    except ImportError:
+        return asyncio.DefaultEventLoopPolicy()
+    return uvloop.EventLoopPolicy()
 
 
-@pytest.fixture
-async def test_db() -> AsyncGenerator[AsyncDatabaseManager, None]:
+# Общая in-memory БД: все соединения движка видят одну и ту же схему
+TEST_DATABASE_URL = "sqlite+aiosqlite:///file:testdb?mode=memory&cache=shared&uri=true"
+
+
+# Планеты для sample_natal_chart: один и тот же объект во всех тестах
+_PLANETS_DATA = {
+    "Солнце": {"sign": "Козерог", "degree": 15.5},
+    "Луна": {"sign": "Рыбы", "degree": 23.2},
+}
+
+
+# Тестовой БД не нужна надежность: отключаем синхронную запись и держим журнал в памяти
+_SQLITE_TEST_PRAGMAS = (
+    "PRAGMA synchronous=OFF",
+    "PRAGMA journal_mode=MEMORY",
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+def _set_sqlite_pragmas(dbapi_conn, connection_record):
+    """Применяет PRAGMA к каждому новому соединению тестового движка"""
+    cursor = dbapi_conn.cursor()
+    for pragma in _SQLITE_TEST_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+def _begin_sqlite_transaction(conn):
+    """Явный BEGIN: драйвер sqlite3 сам его не отправляет, и без него не работают SAVEPOINT"""
+    conn.exec_driver_sql("BEGIN")
+
+
+@pytest_asyncio.fixture(loop_scope="session", scope="session")
+async def test_db_engine() -> AsyncGenerator[AsyncDatabaseManager, None]:
     """
-    Создает временную базу данных в памяти для тестов.
-    Каждый тест получает чистую БД.
+    Создает менеджер БД, движок и схему один раз на всю сессию тестирования.
+    Состояние между тестами сбрасывает откат транзакции в test_db, без DROP/CREATE.
     """
-    # Используем SQLite в памяти для тестов
-    db_manager = AsyncDatabaseManager("sqlite+aiosqlite:///:memory:")
+    from sqlalchemy import event
+
+    from database_async import AsyncDatabaseManager
+
+    db_manager = AsyncDatabaseManager(TEST_DATABASE_URL)
+    # Отключаем неявные транзакции драйвера, BEGIN отправляет слушатель ниже
+    db_manager.db_config = {
+        **db_manager.db_config,
+        "connect_args": {"isolation_level": None},
+    }
 
-    # Создаем таблицы
     await db_manager.init_db()
+    event.listen(db_manager.engine.sync_engine, "begin", _begin_sqlite_transaction)
+    event.listen(db_manager.engine.sync_engine, "connect", _set_sqlite_pragmas)
+
+    # SQLite удаляет shared-cache БД, когда закрывается последнее соединение:
+    # держим отдельное соединение открытым, пока идет сессия
+    keeper = await db_manager.engine.connect()
+    # Соединение из init_db уже открыто до регистрации слушателя, PRAGMA применяем к нему вручную
+    await keeper.run_sync(
+        lambda sync_conn: _set_sqlite_pragmas(sync_conn.connection.dbapi_connection, None)
+    )
 
     yield db_manager
 
-    # Закрываем соединение
+    # Закрываем соединения
+    await keeper.close()
     await db_manager.close()
 
 
-@pytest.fixture
+@pytest_asyncio.fixture(loop_scope="session")
+async def test_db(
+    test_db_engine: AsyncDatabaseManager,
+) -> AsyncGenerator[AsyncDatabaseManager, None]:
+    """
+    Предоставляет БД внутри внешней транзакции, которая откатывается после теста.
+    Каждый commit в коде менеджера становится SAVEPOINT, поэтому каждый тест
+    получает чистую БД без повторного создания таблиц.
+    """
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+    original_factory = test_db_engine.session_factory
+
+    async with test_db_engine.engine.connect() as conn:
+        transaction = await conn.begin()
+        test_db_engine.session_factory = async_sessionmaker(
+            bind=conn,
+            class_=AsyncSession,
+            expire_on_commit=False,
+            join_transaction_mode="create_savepoint",
+        )
+        try:
+            yield test_db_engine
+        finally:
+            test_db_engine.session_factory = original_factory
+            # Кэш менеджера переживает откат транзакции — сбрасываем вместе с ней
+            test_db_engine.invalidate_user()
+            await transaction.rollback()
+
+
+@pytest_asyncio.fixture(loop_scope="session")
 async def test_session(
     test_db: AsyncDatabaseManager,
 ) -> AsyncGenerator[AsyncSession, None]:
@@ -49,41 +139,73 @@ async def test_session(
         yield session
 
 
-@pytest.fixture
-async def sample_user(test_db: AsyncDatabaseManager) -> User:
+@pytest.fixture(scope="session")
+def _seed_rows():
+    """
+    Значения колонок для sample_user и sample_natal_chart, собранные один раз за сессию.
+    Сами строки вставляются в транзакцию теста: тесты на test_db ждут пустые таблицы.
+    """
+    from database_async import NatalChart
+
+    chart = NatalChart()
+    chart.set_planets_data(_PLANETS_DATA)
+
+    return MappingProxyType({
+        "user": MappingProxyType({"telegram_id": 123456789, "name": "Test User"}),
+        "natal_chart": MappingProxyType({
+            "city": "Moscow",
+            "latitude": 55.7558,
+            "longitude": 37.6176,
+            "timezone": "Europe/Moscow",
+            "birth_date": datetime(1990, 1, 1, 12, 0),
+            "birth_time_specified": True,
+            "has_warning": False,
+            "planets_data": chart.planets_data,
+        }),
+    })
+
+
+@pytest_asyncio.fixture(loop_scope="session")
+async def sample_user(test_db: AsyncDatabaseManager, _seed_rows) -> User:
     """Создает тестового пользователя"""
-    user, _ = await test_db.get_or_create_user(telegram_id=123456789, name="Test User")
+    from database_async import User
+
+    # Таблица в транзакции теста пуста, поэтому SELECT из get_or_create_user не нужен
+    user = User(**_seed_rows["user"])
+    async with test_db.get_session() as session:
+        session.add(user)
     return user
 
 
-@pytest.fixture
+@pytest_asyncio.fixture(loop_scope="session")
 async def sample_natal_chart(
-    test_db: AsyncDatabaseManager, sample_user: User
+    test_db: AsyncDatabaseManager, sample_user: User, _seed_rows
 ) -> NatalChart:
     """Создает тестовую натальную карту"""
-    planets_data = {
-        "Солнце": {"sign": "Козерог", "degree": 15.5},
-        "Луна": {"sign": "Рыбы", "degree": 23.2},
-    }
+    from database_async import NatalChart
 
-    chart = await test_db.create_natal_chart(
-        telegram_id=sample_user.telegram_id,
-        name=sample_user.name,
-        city="Moscow",
-        latitude=55.7558,
-        longitude=37.6176,
-        timezone="Europe/Moscow",
-        birth_date=datetime(1990, 1, 1, 12, 0),
-        birth_time_specified=True,
-        has_warning=False,
-        planets_data=planets_data,
-    )
+    # Пользователь уже известен, поэтому вставляем карту напрямую без поиска по telegram_id
+    chart = NatalChart(user_id=sample_user.id, **_seed_rows["natal_chart"])
+    async with test_db.get_session() as session:
+        session.add(chart)
     return chart
 
 
-@pytest.fixture
-def mock_bot():
-    """Мок Telegram бота"""
+@pytest_asyncio.fixture(loop_scope="session")
+async def sample_natal_charts(test_db: AsyncDatabaseManager, sample_user: User, _seed_rows):
+    """Фабрика: вставляет n натальных карт sample_user одним INSERT и возвращает их id"""
+
+    async def create(n: int) -> List[int]:
+        record = {"user_id": sample_user.id, **_seed_rows["natal_chart"]}
+        return await test_db.create_natal_charts_bulk([dict(record) for _ in range(n)])
+
+    return create
+
+
+# Прототипы моков создаются один раз на сессию, фикстуры лишь сбрасывают их состояние
+@pytest.fixture(scope="session")
+def _bot_proto():
+    """Прототип мока Telegram бота"""
     bot = Mock()
     bot.send_message = AsyncMock()
     bot.send_photo = AsyncMock()
@@ -92,10 +214,32 @@ def mock_bot():
     return bot
 
 
+@pytest.fixture(scope="session")
+def _message_proto():
+    """Прототип мока Telegram сообщения"""
+    return Mock()
+
+
+@pytest.fixture(scope="session")
+def _callback_query_proto():
+    """Прототип мока Telegram callback query"""
+    callback = Mock()
+    callback.answer = AsyncMock()
+    return callback
+
+
+@pytest.fixture
+def mock_bot(_bot_proto):
+    """Мок Telegram бота"""
+    _bot_proto.reset_mock(return_value=True, side_effect=True)
+    return _bot_proto
+
+
 @pytest.fixture
-def mock_message():
+def mock_message(_message_proto):
     """Мок Telegram сообщения"""
-    message = Mock()
+    message = _message_proto
+    message.reset_mock(return_value=True, side_effect=True)
     message.from_user.id = 123456789
     message.from_user.first_name = "Test"
     message.from_user.last_name = "User"
@@ -106,43 +250,55 @@ def mock_message():
 
 
 @pytest.fixture
-def mock_callback_query():
+def mock_callback_query(_callback_query_proto):
     """Мок Telegram callback query"""
-    callback = Mock()
+    callback = _callback_query_proto
+    callback.reset_mock(return_value=True, side_effect=True)
     callback.from_user.id = 123456789
     callback.from_user.first_name = "Test"
     callback.from_user.last_name = "User"
     callback.message.chat.id = 123456789
     callback.data = "test_callback"
-    callback.answer = AsyncMock()
     return callback
 
 
+@pytest.fixture(scope="session")
+def _astro_fake():
+    """Заранее собранный мок астрологического калькулятора"""
+    fake = Mock()
+    fake.calculate_natal_chart.return_value = {
+        "Солнце": {"sign": "Козерог", "degree": 15.5},
+        "Луна": {"sign": "Рыбы", "degree": 23.2},
+    }
+    return fake
+
+
+@pytest.fixture(scope="session")
+def _ai_service_fake():
+    """Заранее собранный мок ИИ сервиса"""
+    fake = Mock()
+    fake.get_chat_completion = AsyncMock(return_value="Тестовый прогноз")
+    return fake
+
+
 @pytest.fixture
-def mock_astro_calculations():
+def mock_astro_calculations(monkeypatch, _astro_fake):
     """Мок астрологических расчетов"""
-    with pytest.mock.patch("services.astro_calculations.AstroCalculations") as mock:
-        mock_instance = Mock()
-        mock_instance.calculate_natal_chart.return_value = {
-            "Солнце": {"sign": "Козерог", "degree": 15.5},
-            "Луна": {"sign": "Рыбы", "degree": 23.2},
-        }
-        mock.return_value = mock_instance
-        yield mock_instance
+    _astro_fake.calculate_natal_chart.reset_mock()
+    monkeypatch.setattr(
+        "services.astro_calculations.AstroCalculator", lambda *args, **kwargs: _astro_fake
+    )
+    return _astro_fake
 
 
 @pytest.fixture
-def mock_ai_service():
+def mock_ai_service(monkeypatch, _ai_service_fake):
     """Мок ИИ сервиса для прогнозов"""
-    with pytest.mock.patch("services.ai_predictions.AIPredictionService") as mock:
-        mock_instance = Mock()
-        mock_instance.get_chat_completion = AsyncMock(return_value="Тестовый прогноз")
-        mock.return_value = mock_instance
-        yield mock_instance
-
-
-# Маркеры для категоризации тестов
-pytest_plugins = ["pytest_asyncio"]
+    _ai_service_fake.get_chat_completion.reset_mock()
+    monkeypatch.setattr(
+        "services.ai_predictions.AIPredictionService", lambda *args, **kwargs: _ai_service_fake
+    )
+    return _ai_service_fake
 
 
 # Настройки для различных типов тестов
@@ -155,57 +311,101 @@ def pytest_configure(config):
     config.addinivalue_line("markers", "astro: астрологические расчеты")
 
 
+# CO_COROUTINE | CO_ITERABLE_COROUTINE в co_flags: проверка без inspect.unwrap
+CO_COROUTINE_FLAGS = 0x180
+
+# Признаки тестов БД и астрологических тестов для хука сбора
+_DB_FIXTURES = frozenset({"test_db", "test_session"})
+_ASTRO_RE = re.compile(r"astro|natal", re.IGNORECASE).search
+
+# Метка asyncio для функций, помеченных как корутины; в новых Python ее может не быть
+_IS_COROUTINE = getattr(asyncio.coroutines, "_is_coroutine", object())
+
+
 def pytest_collection_modifyitems(config, items):
     """Автоматически помечает тесты маркерами"""
+    m_async = pytest.mark.asyncio
+    m_db = pytest.mark.database
+    m_astro = pytest.mark.astro
+
     for item in items:
-        # Помечаем все async тесты
-        if asyncio.iscoroutinefunction(item.function):
-            item.add_marker(pytest.mark.asyncio)
+        # Маркеры копим в список и добавляем одним extend вместо add_marker на каждый
+        marks = []
+
+        # async тесты
+        func = item.function
+        if getattr(func, "_is_coroutine", None) is _IS_COROUTINE:
+            marks.append(m_async)
+        else:
+            code = getattr(func, "__code__", None)
+            if code is not None and code.co_flags & CO_COROUTINE_FLAGS:
+                marks.append(m_async)
 
-        # Помечаем тесты БД
-        if "test_db" in item.fixturenames or "test_session" in item.fixturenames:
-            item.add_marker(pytest.mark.database)
+        # Тесты БД
+        if not _DB_FIXTURES.isdisjoint(item.fixturenames):
+            marks.append(m_db)
 
-        # Помечаем астрологические тесты
-        if "astro" in item.name.lower() or "natal" in item.name.lower():
-            item.add_marker(pytest.mark.astro)
+        # Астрологические тесты
+        if _ASTRO_RE(item.name):
+            marks.append(m_astro)
+
+        if marks:
+            # То же, что делает item.add_marker: keywords для -k и own_markers для -m
+            item.keywords.update({marker.name: marker for marker in marks})
+            item.own_markers.extend(marker.mark for marker in marks)
 
 
 # Утилитарные функции для тестов
+# Неизменяемые шаблоны тестовых данных: собираются один раз при импорте
+_BIRTH = datetime(1990, 1, 1, 12, 0)
+
+_USER_TEMPLATE = MappingProxyType({
+    "telegram_id": 123456789,
+    "name": "Test User",
+    "gender": "Мужской",
+    "birth_year": 1990,
+    "birth_city": "Moscow",
+    "birth_date": _BIRTH,
+})
+
+_NATAL_PLANETS_TEMPLATE = MappingProxyType({
+    "Солнце": MappingProxyType({"sign": "Козерог", "degree": 15.5}),
+    "Луна": MappingProxyType({"sign": "Рыбы", "degree": 23.2}),
+    "Меркурий": MappingProxyType({"sign": "Стрелец", "degree": 28.1}),
+    "Венера": MappingProxyType({"sign": "Водолей", "degree": 5.7}),
+    "Марс": MappingProxyType({"sign": "Стрелец", "degree": 12.3}),
+})
+
+_NATAL_TEMPLATE = MappingProxyType({
+    "city": "Moscow",
+    "latitude": 55.7558,
+    "longitude": 37.6176,
+    "timezone": "Europe/Moscow",
+    "birth_date": _BIRTH,
+    "birth_time_specified": True,
+    "has_warning": False,
+})
+
+
 class TestDataFactory:
     """Фабрика тестовых данных"""
 
     @staticmethod
     def create_user_data(telegram_id: int = 123456789) -> dict:
         """Создает данные тестового пользователя"""
-        return {
-            "telegram_id": telegram_id,
-            "name": "Test User",
-            "gender": "Мужской",
-            "birth_year": 1990,
-            "birth_city": "Moscow",
-            "birth_date": datetime(1990, 1, 1, 12, 0),
-        }
+        data = dict(_USER_TEMPLATE)
+        data["telegram_id"] = telegram_id
+        return data
 
     @staticmethod
     def create_natal_chart_data() -> dict:
         """Создает данные тестовой натальной карты"""
-        return {
-            "city": "Moscow",
-            "latitude": 55.7558,
-            "longitude": 37.6176,
-            "timezone": "Europe/Moscow",
-            "birth_date": datetime(1990, 1, 1, 12, 0),
-            "birth_time_specified": True,
-            "has_warning": False,
-            "planets_data": {
-                "Солнце": {"sign": "Козерог", "degree": 15.5},
-                "Луна": {"sign": "Рыбы", "degree": 23.2},
-                "Меркурий": {"sign": "Стрелец", "degree": 28.1},
-                "Венера": {"sign": "Водолей", "degree": 5.7},
-                "Марс": {"sign": "Стрелец", "degree": 12.3},
-            },
+        data = dict(_NATAL_TEMPLATE)
+        # planets_data уходит в json.dumps, поэтому отдаем обычные словари
+        data["planets_data"] = {
+            planet: dict(position) for planet, position in _NATAL_PLANETS_TEMPLATE.items()
         }
+        return data
 
 
 @pytest.fixture
@@ -1,10 +1,17 @@
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
 from dataclasses import asdict, is_dataclass
 from datetime import datetime, timedelta
 from enum import Enum
-from typing import Any, Dict, List, Optional
+from functools import wraps
+from typing import Any, Dict, Iterator, List, Optional
 
 from sqlalchemy import (
+    BigInteger,
     Boolean,
     Column,
     DateTime,
@@ -13,17 +20,98 @@ from sqlalchemy import Enum as SQLEnum
 from sqlalchemy import (
     Float,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
+    and_,
+    case,
     create_engine,
+    event,
     func,
+    inspect,
+    lambda_stmt,
+    literal_column,
+    select,
+    text,
 )
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import Session, joinedload, relationship, sessionmaker
+from sqlalchemy.orm import (
+    Session,
+    lazyload,
+    load_only,
+    raiseload,
+    relationship,
+    sessionmaker,
+)
+from sqlalchemy.sql.expression import FunctionElement
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from models import PlanetPosition, UserListRow
 
 Base = declarative_base()
 
+# PRAGMA для файловой SQLite: WAL не блокирует чтение во время записи,
+# synchronous=NORMAL в режиме WAL не делает fsync на каждый commit
+_SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-65536",
+)
+
+
+class utcnow(FunctionElement):
+    """Текущее время UTC, вычисляемое СУБД (даты в таблицах хранятся в UTC без зоны)"""
+
+    type = DateTime()
+    inherit_cache = True
+
+
+@compiles(utcnow)
+def _compile_utcnow(element, compiler, **kw):
+    return "CURRENT_TIMESTAMP"
+
+
+@compiles(utcnow, "postgresql")
+def _compile_utcnow_postgresql(element, compiler, **kw):
+    return "TIMEZONE('utc', CURRENT_TIMESTAMP)"
+
+
+@compiles(utcnow, "sqlite")
+def _compile_utcnow_sqlite(element, compiler, **kw):
+    # Формат с долями секунды, как SQLAlchemy хранит DateTime в SQLite
+    return "STRFTIME('%Y-%m-%d %H:%M:%f', 'now')"
+
+
+def _set_sqlite_pragmas(dbapi_conn, connection_record):
+    """Применить PRAGMA к каждому новому соединению SQLite"""
+    cursor = dbapi_conn.cursor()
+    for pragma in _SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+def _loads_json(raw: str) -> Any:
+    """Разобрать JSON: orjson, если установлен, иначе stdlib json"""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _dumps_json(data: Any) -> str:
+    """Сериализовать в компактную JSON-строку: orjson, если установлен, иначе stdlib json"""
+    if orjson is not None:
+        return orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+    # Без пробелов после разделителей, как у orjson: blob planets_data заметно короче
+    return json.dumps(data, ensure_ascii=False, default=str, separators=(",", ":"))
+
 
 class SubscriptionType(Enum):
     """Типы подписки"""
@@ -44,9 +132,23 @@ class User(Base):
     """Модель пользователя"""
 
     __tablename__ = "users"
+    __table_args__ = (
+        # Рассылки и статистика выбирают пользователей с заполненным профилем
+        Index("ix_users_profile_complete", "is_profile_complete"),
+        # get_users_for_mailing: частичный индекс только по пользователям с уведомлениями
+        Index(
+            "ix_users_notifications_on",
+            "id",
+            sqlite_where=text("notifications_enabled = 1"),
+            postgresql_where=text("notifications_enabled = true"),
+        ),
+        # Срезы новых пользователей в статистике
+        Index("ix_users_created_at", "created_at", postgresql_include=["id"]),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    telegram_id = Column(Integer, unique=True, nullable=False, index=True)
+    # ID в Telegram не помещаются в 32 бита
+    telegram_id = Column(BigInteger, unique=True, nullable=False, index=True)
     name = Column(String(255), nullable=False)
 
     # Поля профиля
@@ -62,9 +164,10 @@ class User(Base):
     # Настройки уведомлений
     notifications_enabled = Column(Boolean, default=True, nullable=False)
 
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=utcnow(), server_default=utcnow())
 
-    # Связи
+    # Связи. Коллекции грузить только selectinload: joinedload двух соседних
+    # коллекций в одном запросе дает декартово произведение строк
     natal_charts = relationship(
         "NatalChart", back_populates="user", cascade="all, delete-orphan"
     )
@@ -76,6 +179,9 @@ class User(Base):
         back_populates="user",
         uselist=False,
         cascade="all, delete-orphan",
+        # Подписка нужна почти везде, где загружается пользователь: один LEFT JOIN вместо
+        # отдельного SELECT при обращении к user.subscription
+        lazy="joined",
     )
 
     def __repr__(self):
@@ -84,11 +190,13 @@ class User(Base):
     @property
     def is_premium(self) -> bool:
         """Проверяет, есть ли у пользователя активная премиум подписка"""
-        if not self.subscription:
+        subscription = self.subscription
+        if not subscription:
             return False
+        # Дешевая проверка типа первой: для FREE не трогаем часы
         return (
-            self.subscription.is_active
-            and self.subscription.subscription_type == SubscriptionType.PREMIUM
+            subscription.subscription_type is SubscriptionType.PREMIUM
+            and subscription.is_active
         )
 
 
@@ -96,6 +204,16 @@ class Subscription(Base):
     """Модель подписки пользователя"""
 
     __tablename__ = "subscriptions"
+    __table_args__ = (
+        # check_and_expire_subscriptions, cleanup_database, счетчики подписок
+        Index(
+            "ix_subscriptions_status_type_end",
+            "status",
+            "subscription_type",
+            "end_date",
+            postgresql_include=["id"],
+        ),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, unique=True)
@@ -116,8 +234,10 @@ class Subscription(Base):
     payment_amount = Column(Float, nullable=True)  # Сумма платежа
     payment_currency = Column(String(3), nullable=True, default="RUB")  # Валюта
 
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, default=utcnow(), server_default=utcnow())
+    updated_at = Column(
+        DateTime, default=utcnow(), server_default=utcnow(), onupdate=utcnow()
+    )
 
     # Связи
     user = relationship("User", back_populates="subscription")
@@ -128,7 +248,7 @@ class Subscription(Base):
     @property
     def is_active(self) -> bool:
         """Проверяет, активна ли подписка"""
-        if self.status != SubscriptionStatus.ACTIVE:
+        if self.status is not SubscriptionStatus.ACTIVE:
             return False
 
         # Проверяем дату окончания (если она есть)
@@ -147,10 +267,54 @@ class Subscription(Base):
         return max(0, remaining.days)
 
 
+# Бессрочная подписка (end_date IS NULL) считается действующей до этой даты:
+# условие активности — один диапазон по выражению вместо OR IS NULL
+_END_DATE_EFFECTIVE = func.coalesce(
+    Subscription.end_date, literal_column("'9999-12-31 00:00:00'", DateTime)
+)
+
+# _active_premium_clause: частичный индекс по выражению только для активных Premium
+Index(
+    "ix_subscriptions_active_premium",
+    _END_DATE_EFFECTIVE,
+    sqlite_where=text("status = 'ACTIVE' AND subscription_type = 'PREMIUM'"),
+    postgresql_where=text("status = 'ACTIVE' AND subscription_type = 'PREMIUM'"),
+)
+
+
+def _active_premium_clause():
+    """Условие «активная Premium-подписка» для запросов (см. Subscription.is_active)"""
+    return and_(
+        Subscription.subscription_type == SubscriptionType.PREMIUM,
+        Subscription.status == SubscriptionStatus.ACTIVE,
+        _END_DATE_EFFECTIVE > utcnow(),
+    )
+
+
+def _expired_premium_clause():
+    """
+    Условие «Premium-подписка истекла, но еще ACTIVE» — обратное к _active_premium_clause.
+    Общее для всех путей, отмечающих подписки EXPIRED; префикс ix_subscriptions_status_type_end
+    """
+    return and_(
+        Subscription.status == SubscriptionStatus.ACTIVE,
+        Subscription.subscription_type == SubscriptionType.PREMIUM,
+        Subscription.end_date <= utcnow(),
+    )
+
+
 class NatalChart(Base):
     """Модель натальной карты"""
 
     __tablename__ = "natal_charts"
+    __table_args__ = (
+        # find_existing_chart
+        Index("ix_natal_charts_user_date_city", "user_id", "birth_date", "city"),
+        # get_user_charts, get_user_activity: COUNT/MAX(created_at) по индексу
+        Index("ix_natal_charts_user_created", "user_id", "created_at"),
+        # Срезы по дням в статистике
+        Index("ix_natal_charts_created_at", "created_at", postgresql_include=["id"]),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -177,7 +341,7 @@ class NatalChart(Base):
     # Данные расчетов (JSON)
     planets_data = Column(Text, nullable=False)  # JSON с данными планет
 
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=utcnow(), server_default=utcnow())
 
     # Связь с пользователем
     user = relationship("User", back_populates="natal_charts")
@@ -185,21 +349,30 @@ class NatalChart(Base):
         "Prediction", back_populates="natal_chart", cascade="all, delete-orphan"
     )
 
-    def get_planets_data(self) -> Dict[str, "PlanetPosition"]:
+    # Разобранный planets_data: (исходная JSON-строка, словарь PlanetPosition)
+    _planets_cache = None
+
+    def get_planets_data(self) -> Dict[str, PlanetPosition]:
         """Получить данные планет как словарь объектов PlanetPosition"""
-        from models import PlanetPosition
+        raw = self.planets_data
+        cache = self._planets_cache
+        # Кэш действителен, пока колонка не перезаписана (set_planets_data, refresh из БД)
+        if cache is not None and cache[0] is raw:
+            return cache[1]
 
-        raw_data = json.loads(self.planets_data)
+        raw_data = _loads_json(raw)
         planets_objects = {}
         for planet_name, position_data in raw_data.items():
             planets_objects[planet_name] = PlanetPosition(
                 sign=position_data["sign"], degree=position_data["degree"]
             )
+        self._planets_cache = (raw, planets_objects)
         return planets_objects
 
     def set_planets_data(self, data: Dict[str, Any]):
         """Сохранить данные планет как JSON"""
-        self.planets_data = json.dumps(data, ensure_ascii=False, default=str)
+        self.planets_data = _dumps_json(data)
+        self._planets_cache = None
 
     def __repr__(self):
         return f"<NatalChart(user_id={self.user_id}, type='{self.chart_type}', city='{self.city}', birth_date='{self.birth_date}')>"
@@ -209,6 +382,20 @@ class Prediction(Base):
     """Модель прогноза"""
 
     __tablename__ = "predictions"
+    __table_args__ = (
+        # find_valid_prediction
+        Index("ix_predictions_chart_type_valid", "natal_chart_id", "prediction_type", "valid_until"),
+        # get_user_predictions, get_active_predictions_count
+        Index("ix_predictions_user_valid", "user_id", "valid_until", "valid_from"),
+        # get_last_prediction_time
+        Index("ix_predictions_chart_created", "natal_chart_id", "created_at"),
+        # get_user_activity: COUNT/MAX(created_at) по индексу
+        Index("ix_predictions_user_created", "user_id", "created_at"),
+        # Срезы по дням в статистике
+        Index("ix_predictions_created_at", "created_at", postgresql_include=["id"]),
+        # cleanup_expired_predictions, cleanup_database
+        Index("ix_predictions_valid_until", "valid_until"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -227,7 +414,7 @@ class Prediction(Base):
     # Время генерации
     generation_time = Column(Float, nullable=True)  # Время генерации в секундах
 
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=utcnow(), server_default=utcnow())
 
     # Связи
     user = relationship("User", back_populates="predictions")
@@ -260,7 +447,7 @@ class CompatibilityReport(Base):
     sphere = Column(String(50), nullable=False)  # 'love', 'career', 'friendship'
     report_text = Column(Text, nullable=False)
 
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=utcnow(), server_default=utcnow())
 
     user = relationship("User")
 
@@ -268,22 +455,230 @@ class CompatibilityReport(Base):
         return f"<CompatibilityReport(user='{self.user_name}', partner='{self.partner_name}', sphere='{self.sphere}')>"
 
 
+class StatsSnapshot(Base):
+    """Снимок счетчиков get_detailed_statistics (админ-панели не нужна посекундная точность)"""
+
+    __tablename__ = "stats_snapshots"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    captured_at = Column(DateTime, nullable=False, default=utcnow(), index=True)
+
+    total_users = Column(Integer, nullable=False)
+    users_today = Column(Integer, nullable=False)
+    users_yesterday = Column(Integer, nullable=False)
+    users_week = Column(Integer, nullable=False)
+    users_month = Column(Integer, nullable=False)
+    active_premium = Column(Integer, nullable=False)
+    expired_premium = Column(Integer, nullable=False)
+    total_charts = Column(Integer, nullable=False)
+    charts_today = Column(Integer, nullable=False)
+    charts_week = Column(Integer, nullable=False)
+    total_predictions = Column(Integer, nullable=False)
+    predictions_today = Column(Integer, nullable=False)
+    predictions_week = Column(Integer, nullable=False)
+
+    def to_statistics(self) -> Dict[str, Any]:
+        """Представить снимок в формате get_detailed_statistics"""
+        return {
+            "users": {
+                "total": self.total_users,
+                "today": self.users_today,
+                "yesterday": self.users_yesterday,
+                "week": self.users_week,
+                "month": self.users_month,
+            },
+            "subscriptions": {
+                "active_premium": self.active_premium,
+                "expired_premium": self.expired_premium,
+                "conversion_rate": (
+                    round((self.active_premium / self.total_users * 100), 2)
+                    if self.total_users > 0
+                    else 0
+                ),
+            },
+            "content": {
+                "total_charts": self.total_charts,
+                "charts_today": self.charts_today,
+                "charts_week": self.charts_week,
+                "total_predictions": self.total_predictions,
+                "predictions_today": self.predictions_today,
+                "predictions_week": self.predictions_week,
+            },
+        }
+
+    def __repr__(self):
+        return f"<StatsSnapshot(captured_at='{self.captured_at}', total_users={self.total_users})>"
+
+
+# Сколько живет снимок статистики админ-панели
+STATS_SNAPSHOT_MAX_AGE = timedelta(minutes=10)
+
+# Сколько секунд живут в памяти результаты счетчиков для админ-панели
+STATS_CACHE_TTL = 30.0
+
+# Сколько секунд живет сопоставление telegram_id -> users.id: удаление пользователя
+# мимо этого менеджера (async-менеджер, другой процесс) не оставит устаревший id
+USER_ID_CACHE_TTL = 60.0
+
+
+def _cached_stats(method):
+    """Кэшировать результат метода статистики на STATS_CACHE_TTL секунд"""
+
+    @wraps(method)
+    def wrapper(self) -> Dict[str, Any]:
+        key = method.__name__
+        now = time.monotonic()
+        with self._stats_lock:
+            cached = self._stats_cache.get(key)
+        if cached is not None and now - cached[0] < STATS_CACHE_TTL:
+            return dict(cached[1])
+
+        value = method(self)
+        with self._stats_lock:
+            self._stats_cache[key] = (now, value)
+        return dict(value)
+
+    return wrapper
+
+# Список SQL текущего query_counter(); None — счетчик не активен
+_executed_statements: ContextVar[Optional[List[str]]] = ContextVar(
+    "executed_statements", default=None
+)
+
+
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    """Запомнить SQL, если внутри query_counter()"""
+    statements = _executed_statements.get()
+    if statements is not None:
+        statements.append(statement)
+
+
+def _to_user_list_rows(rows) -> List[UserListRow]:
+    """Преобразовать строки _user_list_query в UserListRow"""
+    return [
+        UserListRow(
+            id=row.id,
+            telegram_id=row.telegram_id,
+            name=row.name,
+            created_at=row.created_at,
+            subscription_type=(
+                row.subscription_type.value if row.subscription_type else None
+            ),
+            end_date=row.end_date,
+            is_premium=bool(row.is_premium),
+        )
+        for row in rows
+    ]
+
+
+def _count_if(condition):
+    """COUNT строк, удовлетворяющих условию, внутри общего агрегатного запроса"""
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+def _raise_on_lazy_load(orm_execute_state):
+    """Запретить lazy="select"-связи в SELECT, чтобы скрытый N+1 падал сразу.
+
+    raiseload("*") не подходит: он перекрывает и lazy="joined" из маппера.
+    """
+    if not orm_execute_state.is_select:
+        return
+    # Только сущности, выбранные целиком: к SELECT колонок loader-опции не применимы
+    entities = [
+        desc["entity"]
+        for desc in orm_execute_state.statement.column_descriptions
+        if desc["entity"] is not None and desc["expr"] is desc["entity"]
+    ]
+    options = [
+        raiseload(getattr(entity, rel.key))
+        for entity in entities
+        for rel in inspect(entity).relationships
+        if rel.lazy == "select"
+    ]
+    if options:
+        orm_execute_state.statement = orm_execute_state.statement.options(*options)
+
+
 class DatabaseManager:
     """Менеджер для работы с базой данных"""
 
-    def __init__(self, database_url: str = "sqlite:///astro_bot.db"):
+    def __init__(
+        self,
+        database_url: str = "sqlite:///astro_bot.db",
+        strict_loading: bool = False,
+        debug: bool = False,
+    ):
+        # strict_loading: ленивые загрузки в read-сессиях падают сразу (для тестов)
+        self.strict_loading = strict_loading
         self.engine = create_engine(database_url, echo=False)
+        if self.engine.dialect.name == "sqlite":
+            event.listen(self.engine, "connect", _set_sqlite_pragmas)
+        # debug: считаем запросы для query_counter(), в продакшене хук не ставится
+        if debug:
+            event.listen(self.engine, "before_cursor_execute", _record_statement)
+        # expire_on_commit=False: объекты отдаются наружу после закрытия сессии,
+        # повторная загрузка атрибутов после commit не нужна
         self.SessionLocal = sessionmaker(
-            autocommit=False, autoflush=False, bind=self.engine
+            autocommit=False, autoflush=False, bind=self.engine, expire_on_commit=False
         )
 
         # Создаем таблицы
         Base.metadata.create_all(bind=self.engine)
 
+        # telegram_id -> (время, users.id): id пользователя не меняется, пока он не удален
+        self._user_ids: Dict[int, tuple[float, int]] = {}
+
+        # Кэш счетчиков статистики: имя метода -> (время, результат)
+        self._stats_cache: Dict[str, tuple[float, Dict[str, Any]]] = {}
+        self._stats_lock = threading.Lock()
+
     def get_session(self) -> Session:
         """Получить сессию базы данных"""
         return self.SessionLocal()
 
+    @contextmanager
+    def get_read_session(self) -> Iterator[Session]:
+        """Сессия только для чтения: без commit, соединение просто возвращается в пул"""
+        with self.engine.connect() as conn, Session(
+            bind=conn, autoflush=False, expire_on_commit=False
+        ) as session:
+            if self.strict_loading:
+                event.listen(session, "do_orm_execute", _raise_on_lazy_load)
+            yield session
+
+    @staticmethod
+    @contextmanager
+    def query_counter() -> Iterator[List[str]]:
+        """Собрать SQL, выполненные внутри блока (нужен DatabaseManager(debug=True))"""
+        statements: List[str] = []
+        token = _executed_statements.set(statements)
+        try:
+            yield statements
+        finally:
+            _executed_statements.reset(token)
+
+    def _invalidate_stats(self) -> None:
+        """Сбросить кэш статистики после изменения подписок"""
+        with self._stats_lock:
+            self._stats_cache.clear()
+
+    def _get_user_id(self, session: Session, telegram_id: int) -> Optional[int]:
+        """Получить users.id по telegram_id из кэша, без JOIN в запросах к дочерним таблицам"""
+        now = time.monotonic()
+        cached = self._user_ids.get(telegram_id)
+        if cached is not None and now - cached[0] < USER_ID_CACHE_TTL:
+            return cached[1]
+
+        stmt = lambda_stmt(
+            lambda: select(User.id).where(User.telegram_id == telegram_id)
+        )
+        user_id = session.execute(stmt).scalar()
+        if user_id is not None:
+            self._user_ids[telegram_id] = (now, user_id)
+        else:
+            self._user_ids.pop(telegram_id, None)
+        return user_id
+
     def get_or_create_user(self, telegram_id: int, name: str) -> tuple[User, bool]:
         """Получить или создать пользователя
 
@@ -293,16 +688,16 @@ class DatabaseManager:
         with self.get_session() as session:
             user = (
                 session.query(User)
-                .options(joinedload(User.subscription))
                 .filter(User.telegram_id == telegram_id)
                 .first()
             )
 
             if not user:
-                user = User(telegram_id=telegram_id, name=name)
+                # subscription=None: у нового пользователя подписки нет, и обращение
+                # к атрибуту после закрытия сессии не пойдет в БД
+                user = User(telegram_id=telegram_id, name=name, subscription=None)
                 session.add(user)
                 session.commit()
-                session.refresh(user)
                 return user, True  # Пользователь был создан
             else:
                 # Обновляем имя если изменилось
@@ -329,7 +724,7 @@ class DatabaseManager:
                 # Если пользователь не найден, создаем его
                 if not name:
                     return None
-                user = User(telegram_id=telegram_id, name=name)
+                user = User(telegram_id=telegram_id, name=name, subscription=None)
                 session.add(user)
 
             # Обновляем поля, если переданы значения
@@ -347,55 +742,63 @@ class DatabaseManager:
                 user.birth_time_specified = birth_time_specified
 
             # Проверяем, заполнен ли профиль полностью
-            is_complete = all(
-                [user.name, user.gender, user.birth_date, user.birth_city]
+            user.is_profile_complete = bool(
+                user.name and user.gender and user.birth_date and user.birth_city
             )
-            user.is_profile_complete = is_complete
 
             session.commit()
-            session.refresh(user)
             return user
 
     def get_user_profile(self, telegram_id: int) -> Optional[User]:
         """Получить профиль пользователя"""
-        with self.get_session() as session:
-            return (
-                session.query(User)
-                .options(joinedload(User.subscription))
-                .filter(User.telegram_id == telegram_id)
-                .first()
-            )
+        with self.get_read_session() as session:
+            stmt = lambda_stmt(lambda: select(User).where(User.telegram_id == telegram_id))
+            return session.execute(stmt).scalars().first()
 
     def set_notifications(self, telegram_id: int, enabled: bool) -> bool:
         """Включить или выключить уведомления для пользователя."""
         with self.get_session() as session:
-            user = session.query(User).filter(User.telegram_id == telegram_id).first()
-            if user:
-                user.notifications_enabled = enabled
-                session.commit()
-                return True
-            return False
+            # Один UPDATE без предварительной загрузки пользователя
+            updated = (
+                session.query(User)
+                .filter(User.telegram_id == telegram_id)
+                .update({User.notifications_enabled: enabled}, synchronize_session=False)
+            )
+            session.commit()
+            return updated > 0
 
     def get_total_users_count(self) -> int:
         """Возвращает общее количество пользователей в базе."""
-        with self.get_session() as session:
+        with self.get_read_session() as session:
             return session.query(func.count(User.id)).scalar()
 
     def get_users_for_mailing(self) -> List[User]:
-        """Получить всех пользователей, у которых включены уведомления."""
-        with self.get_session() as session:
-            return session.query(User).filter(User.notifications_enabled == True).all()
+        """Получить всех пользователей, у которых включены уведомления.
+
+        Для рассылки загружаются только telegram_id и name.
+        """
+        with self.get_read_session() as session:
+            # == True, а не is_(True): условие должно совпасть с частичным индексом
+            return (
+                session.query(User)
+                .options(load_only(User.telegram_id, User.name), lazyload(User.subscription))
+                .filter(User.notifications_enabled == True)
+                .all()
+            )
 
     def find_existing_chart(
         self, telegram_id: int, city: str, birth_date: datetime
     ) -> Optional[NatalChart]:
         """Найти существующую натальную карту с такими же данными"""
-        with self.get_session() as session:
+        with self.get_read_session() as session:
+            user_id = self._get_user_id(session, telegram_id)
+            if user_id is None:
+                return None
+
             chart = (
                 session.query(NatalChart)
-                .join(User)
                 .filter(
-                    User.telegram_id == telegram_id,
+                    NatalChart.user_id == user_id,
                     NatalChart.city == city,
                     NatalChart.birth_date == birth_date,
                 )
@@ -460,17 +863,49 @@ class DatabaseManager:
 
             session.add(new_chart)
             session.commit()
-            session.refresh(new_chart)
 
             return new_chart
 
+    def create_natal_charts_bulk(self, rows: List[Dict[str, Any]]) -> int:
+        """Создать несколько натальных карт одним INSERT (executemany)
+
+        Args:
+            rows: значения колонок natal_charts (user_id, city, birth_date, ...);
+                planets_data можно передать словарем, он будет сериализован в JSON
+
+        Returns:
+            int: количество созданных карт
+        """
+        if not rows:
+            return 0
+
+        records = []
+        for row in rows:
+            planets_data = row.get("planets_data")
+            if not isinstance(planets_data, str):
+                planets_data = planets_data or {}
+                first_value = next(iter(planets_data.values()), None)
+                if first_value and is_dataclass(first_value):
+                    planets_data = {name: asdict(pos) for name, pos in planets_data.items()}
+                row = {**row, "planets_data": _dumps_json(planets_data)}
+            records.append(row)
+
+        with self.get_session() as session:
+            session.execute(NatalChart.__table__.insert(), records)
+            session.commit()
+
+        return len(records)
+
     def get_user_charts(self, telegram_id: int) -> List[NatalChart]:
         """Получить все натальные карты пользователя"""
-        with self.get_session() as session:
+        with self.get_read_session() as session:
+            user_id = self._get_user_id(session, telegram_id)
+            if user_id is None:
+                return []
+
             charts = (
                 session.query(NatalChart)
-                .join(User)
-                .filter(User.telegram_id == telegram_id)
+                .filter(NatalChart.user_id == user_id)
                 .order_by(NatalChart.created_at.desc())
                 .all()
             )
@@ -479,27 +914,24 @@ class DatabaseManager:
 
     def get_chart_by_id(self, chart_id: int, telegram_id: int) -> Optional[NatalChart]:
         """Получить натальную карту по ID (с проверкой владельца)"""
-        with self.get_session() as session:
-            chart = (
-                session.query(NatalChart)
-                .join(User)
-                .filter(NatalChart.id == chart_id, User.telegram_id == telegram_id)
-                .first()
-            )
+        with self.get_read_session() as session:
+            user_id = self._get_user_id(session, telegram_id)
+            if user_id is None:
+                return None
 
-            return chart
+            # Поиск по PK без компиляции запроса, владельца проверяем в Python
+            chart = session.get(NatalChart, chart_id)
+            return chart if chart is not None and chart.user_id == user_id else None
 
     def delete_natal_chart(self, chart_id: int, telegram_id: int) -> bool:
         """Удалить натальную карту (с проверкой владельца)"""
         with self.get_session() as session:
-            chart = (
-                session.query(NatalChart)
-                .join(User)
-                .filter(NatalChart.id == chart_id, User.telegram_id == telegram_id)
-                .first()
-            )
+            user_id = self._get_user_id(session, telegram_id)
+            if user_id is None:
+                return False
 
-            if chart:
+            chart = session.get(NatalChart, chart_id)
+            if chart is not None and chart.user_id == user_id:
                 session.delete(chart)
                 session.commit()
                 return True
@@ -518,12 +950,26 @@ class DatabaseManager:
             if not user:
                 return False, 0
 
-            # Подсчитываем количество карт перед удалением
-            charts_count = len(user.natal_charts)
+            # Подсчитываем количество карт перед удалением без загрузки самих карт
+            charts_count = (
+                session.query(func.count(NatalChart.id))
+                .filter(NatalChart.user_id == user.id)
+                .scalar()
+            )
+
+            # Массовый DELETE вместо построчного каскада ORM.
+            # Прогнозы удаляем первыми: они ссылаются на натальные карты
+            session.query(Prediction).filter(Prediction.user_id == user.id).delete(
+                synchronize_session=False
+            )
+            session.query(NatalChart).filter(NatalChart.user_id == user.id).delete(
+                synchronize_session=False
+            )
 
-            # Удаляем пользователя (каскадно удалятся и все его карты благодаря cascade="all, delete-orphan")
+            # Удаляем пользователя (подписка удалится каскадно)
             session.delete(user)
             session.commit()
+            self._user_ids.pop(telegram_id, None)
 
             return True, charts_count
 
@@ -531,23 +977,24 @@ class DatabaseManager:
         self, telegram_id: int, chart_id: int, prediction_type: str
     ) -> Optional[Prediction]:
         """Найти действующий прогноз для карты и типа"""
-        with self.get_session() as session:
-            now = datetime.utcnow()
+        with self.get_read_session() as session:
+            user_id = self._get_user_id(session, telegram_id)
+            if user_id is None:
+                return None
 
-            prediction = (
-                session.query(Prediction)
-                .join(User)
-                .filter(
-                    User.telegram_id == telegram_id,
+            stmt = lambda_stmt(
+                lambda: select(Prediction)
+                .where(
+                    Prediction.user_id == user_id,
                     Prediction.natal_chart_id == chart_id,
                     Prediction.prediction_type == prediction_type,
-                    Prediction.valid_from <= now,
-                    Prediction.valid_until >= now,
+                    Prediction.valid_from <= utcnow(),
+                    Prediction.valid_until >= utcnow(),
                 )
-                .first()
+                .limit(1)
             )
 
-            return prediction
+            return session.execute(stmt).scalars().first()
 
     def create_prediction(
         self,
@@ -579,7 +1026,6 @@ class DatabaseManager:
 
             session.add(prediction)
             session.commit()
-            session.refresh(prediction)
 
             return prediction
 
@@ -587,12 +1033,12 @@ class DatabaseManager:
         self, telegram_id: int, active_only: bool = True
     ) -> List[Prediction]:
         """Получить прогнозы пользователя"""
-        with self.get_session() as session:
-            query = (
-                session.query(Prediction)
-                .join(User)
-                .filter(User.telegram_id == telegram_id)
-            )
+        with self.get_read_session() as session:
+            user_id = self._get_user_id(session, telegram_id)
+            if user_id is None:
+                return []
+
+            query = session.query(Prediction).filter(Prediction.user_id == user_id)
 
             if active_only:
                 now = datetime.utcnow()
@@ -605,7 +1051,7 @@ class DatabaseManager:
 
     def get_last_prediction_time(self, chart_id: int) -> Optional[datetime]:
         """Получить время последнего прогноза для карты"""
-        with self.get_session() as session:
+        with self.get_read_session() as session:
             last_prediction = (
                 session.query(Prediction)
                 .filter(Prediction.natal_chart_id == chart_id)
@@ -619,33 +1065,31 @@ class DatabaseManager:
 
     def get_active_predictions_count(self, telegram_id: int) -> int:
         """Получить количество активных прогнозов пользователя"""
-        with self.get_session() as session:
-            now = datetime.utcnow()
-
-            count = (
-                session.query(Prediction)
-                .join(User)
-                .filter(
-                    User.telegram_id == telegram_id,
-                    Prediction.valid_from <= now,
-                    Prediction.valid_until >= now,
+        with self.get_read_session() as session:
+            user_id = self._get_user_id(session, telegram_id)
+            if user_id is None:
+                return 0
+
+            stmt = lambda_stmt(
+                lambda: select(func.count(Prediction.id)).where(
+                    Prediction.user_id == user_id,
+                    Prediction.valid_from <= utcnow(),
+                    Prediction.valid_until >= utcnow(),
                 )
-                .count()
             )
 
-            return count
+            return session.execute(stmt).scalar_one()
 
     def cleanup_expired_predictions(self) -> int:
         """Удалить истекшие прогнозы (для очистки БД)"""
         with self.get_session() as session:
-            now = datetime.utcnow()
-
+            # Один DELETE: количество удаленных строк возвращает сам запрос
             expired_count = (
-                session.query(Prediction).filter(Prediction.valid_until < now).count()
+                session.query(Prediction)
+                .filter(Prediction.valid_until < utcnow())
+                .delete(synchronize_session=False)
             )
 
-            session.query(Prediction).filter(Prediction.valid_until < now).delete()
-
             session.commit()
             return expired_count
 
@@ -676,12 +1120,11 @@ class DatabaseManager:
             )
             session.add(new_report)
             session.commit()
-            session.refresh(new_report)
             return new_report
 
     def get_user_compatibility_reports(self, user_id: int) -> List[CompatibilityReport]:
         """Получает все отчеты о совместимости для пользователя."""
-        with self.get_session() as session:
+        with self.get_read_session() as session:
             user = session.query(User).filter_by(id=user_id).first()
             if not user:
                 return []
@@ -697,23 +1140,15 @@ class DatabaseManager:
         self, report_id: int, user_id: int
     ) -> Optional[CompatibilityReport]:
         """Получает отчет о совместимости по ID с проверкой владельца."""
-        with self.get_session() as session:
-            report = (
-                session.query(CompatibilityReport)
-                .filter_by(id=report_id, user_id=user_id)
-                .first()
-            )
-            return report
+        with self.get_read_session() as session:
+            report = session.get(CompatibilityReport, report_id)
+            return report if report is not None and report.user_id == user_id else None
 
     def delete_compatibility_report(self, report_id: int, user_id: int) -> bool:
         """Удаляет отчет о совместимости по ID с проверкой владельца."""
         with self.get_session() as session:
-            report = (
-                session.query(CompatibilityReport)
-                .filter_by(id=report_id, user_id=user_id)
-                .first()
-            )
-            if report:
+            report = session.get(CompatibilityReport, report_id)
+            if report is not None and report.user_id == user_id:
                 session.delete(report)
                 session.commit()
                 return True
@@ -744,7 +1179,6 @@ class DatabaseManager:
                 )
                 session.add(subscription)
                 session.commit()
-                session.refresh(subscription)
 
             return subscription
 
@@ -768,58 +1202,56 @@ class DatabaseManager:
                 .first()
             )
 
+            # Одно значение времени на вызов: start_date и end_date согласованы
+            now = datetime.utcnow()
             if subscription:
                 # Обновляем существующую подписку
                 subscription.subscription_type = SubscriptionType.PREMIUM
                 subscription.status = SubscriptionStatus.ACTIVE
-                subscription.start_date = datetime.utcnow()
-                subscription.end_date = datetime.utcnow() + timedelta(
-                    days=duration_days
-                )
+                subscription.start_date = now
+                subscription.end_date = now + timedelta(days=duration_days)
                 subscription.payment_id = payment_id
                 subscription.payment_amount = payment_amount
-                subscription.updated_at = datetime.utcnow()
             else:
                 # Создаем новую премиум подписку
                 subscription = Subscription(
                     user_id=user.id,
                     subscription_type=SubscriptionType.PREMIUM,
                     status=SubscriptionStatus.ACTIVE,
-                    start_date=datetime.utcnow(),
-                    end_date=datetime.utcnow() + timedelta(days=duration_days),
+                    start_date=now,
+                    end_date=now + timedelta(days=duration_days),
                     payment_id=payment_id,
                     payment_amount=payment_amount,
                 )
                 session.add(subscription)
 
             session.commit()
-            session.refresh(subscription)
+            self._invalidate_stats()
             return subscription
 
     def cancel_subscription(self, telegram_id: int) -> bool:
         """Отменить подписку пользователя"""
         with self.get_session() as session:
-            user = session.query(User).filter(User.telegram_id == telegram_id).first()
-            if not user:
+            user_id = self._get_user_id(session, telegram_id)
+            if user_id is None:
                 return False
 
-            subscription = (
+            # Один UPDATE без загрузки подписки
+            updated = (
                 session.query(Subscription)
-                .filter(Subscription.user_id == user.id)
-                .first()
+                .filter(Subscription.user_id == user_id)
+                .update(
+                    {Subscription.status: SubscriptionStatus.CANCELLED},
+                    synchronize_session=False,
+                )
             )
-            if not subscription:
-                return False
-
-            subscription.status = SubscriptionStatus.CANCELLED
-            subscription.updated_at = datetime.utcnow()
-
             session.commit()
-            return True
+            self._invalidate_stats()
+            return updated > 0
 
     def get_subscription_info(self, telegram_id: int) -> Optional[Dict[str, Any]]:
         """Получить информацию о подписке пользователя"""
-        with self.get_session() as session:
+        with self.get_read_session() as session:
             user = session.query(User).filter(User.telegram_id == telegram_id).first()
             if not user:
                 return None
@@ -832,12 +1264,13 @@ class DatabaseManager:
             if not subscription:
                 return None
 
+            is_active = subscription.is_active
             return {
                 "type": subscription.subscription_type.value,
                 "status": subscription.status.value,
-                "is_active": subscription.is_active,
-                "is_premium": subscription.subscription_type == SubscriptionType.PREMIUM
-                and subscription.is_active,
+                "is_active": is_active,
+                "is_premium": subscription.subscription_type is SubscriptionType.PREMIUM
+                and is_active,
                 "start_date": subscription.start_date,
                 "end_date": subscription.end_date,
                 "days_remaining": subscription.days_remaining,
@@ -848,30 +1281,24 @@ class DatabaseManager:
     def check_and_expire_subscriptions(self) -> int:
         """Проверить и отметить истекшие подписки"""
         with self.get_session() as session:
-            now = datetime.utcnow()
-
-            # Находим все активные подписки с истекшим сроком
-            expired_subscriptions = (
+            # Один UPDATE без загрузки строк; updated_at ставит onupdate.
+            # end_date есть только у Premium, фильтр по типу дает поиск по индексу
+            count = (
                 session.query(Subscription)
-                .filter(
-                    Subscription.status == SubscriptionStatus.ACTIVE,
-                    Subscription.end_date.isnot(None),
-                    Subscription.end_date <= now,
+                .filter(_expired_premium_clause())
+                .update(
+                    {Subscription.status: SubscriptionStatus.EXPIRED},
+                    synchronize_session=False,
                 )
-                .all()
             )
 
-            count = 0
-            for subscription in expired_subscriptions:
-                subscription.status = SubscriptionStatus.EXPIRED
-                subscription.updated_at = now
-                count += 1
-
             if count > 0:
                 session.commit()
+                self._invalidate_stats()
 
             return count
 
+    @_cached_stats
     def get_subscription_stats(self) -> Dict[str, int]:
         """Получить статистику по подпискам"""
         with self.get_session() as session:
@@ -885,41 +1312,29 @@ class DatabaseManager:
 
             return {str(k.name): v for k, v in stats}
 
+    @_cached_stats
     def get_app_statistics(self) -> Dict[str, int]:
         """Собирает общую статистику по приложению."""
         with self.get_session() as session:
-            total_users = session.query(func.count(User.id)).scalar()
-
             today_start = datetime.utcnow().replace(
                 hour=0, minute=0, second=0, microsecond=0
             )
             seven_days_ago = today_start - timedelta(days=7)
             thirty_days_ago = today_start - timedelta(days=30)
 
-            new_users_today = (
-                session.query(func.count(User.id))
-                .filter(User.created_at >= today_start)
-                .scalar()
-            )
-            new_users_7_days = (
-                session.query(func.count(User.id))
-                .filter(User.created_at >= seven_days_ago)
-                .scalar()
-            )
-            new_users_30_days = (
-                session.query(func.count(User.id))
-                .filter(User.created_at >= thirty_days_ago)
-                .scalar()
+            # Все срезы по пользователям за один проход по таблице
+            total_users, new_users_today, new_users_7_days, new_users_30_days = (
+                session.query(
+                    func.count(User.id),
+                    _count_if(User.created_at >= today_start),
+                    _count_if(User.created_at >= seven_days_ago),
+                    _count_if(User.created_at >= thirty_days_ago),
+                ).one()
             )
 
             active_premium = (
                 session.query(func.count(Subscription.id))
-                .filter(
-                    Subscription.subscription_type == SubscriptionType.PREMIUM,
-                    Subscription.status == SubscriptionStatus.ACTIVE,
-                    (Subscription.end_date == None)
-                    | (Subscription.end_date > datetime.utcnow()),
-                )
+                .filter(_active_premium_clause())
                 .scalar()
             )
 
@@ -941,260 +1356,301 @@ class DatabaseManager:
     # === РАСШИРЕННЫЕ МЕТОДЫ ДЛЯ АДМИН-ПАНЕЛИ ===
 
     def get_users_paginated(
-        self, page: int = 1, per_page: int = 10, user_type: str = "all"
-    ) -> tuple[List[User], int]:
-        """Получить пользователей с пагинацией."""
+        self,
+        page: int = 1,
+        per_page: int = 10,
+        user_type: str = "all",
+        after_id: Optional[int] = None,
+    ) -> tuple[List[UserListRow], Optional[int]]:
+        """Получить пользователей с пагинацией.
+
+        Без after_id — страница page по OFFSET, вторым значением идет число страниц.
+        after_id — keyset-курсор (id последнего пользователя предыдущей страницы):
+        страница читается по индексу PK без OFFSET и COUNT, page не используется,
+        вторым значением идет курсор следующей страницы (None — страниц больше нет).
+        """
         with self.get_session() as session:
-            query = session.query(User).options(joinedload(User.subscription))
+            # Фильтры и пагинация работают только по узкому User.id
+            ids_query = session.query(User.id)
 
             if user_type == "premium":
-                query = query.join(Subscription).filter(
-                    Subscription.subscription_type == SubscriptionType.PREMIUM,
-                    Subscription.status == SubscriptionStatus.ACTIVE,
-                    (Subscription.end_date == None)
-                    | (Subscription.end_date > datetime.utcnow()),
-                )
+                ids_query = ids_query.join(Subscription).filter(_active_premium_clause())
             elif user_type == "active":
                 # Пользователи с активностью за последние 7 дней
                 week_ago = datetime.utcnow() - timedelta(days=7)
-                query = query.filter(User.created_at >= week_ago)
-
-            total_count = query.count()
-            total_pages = (total_count + per_page - 1) // per_page
+                ids_query = ids_query.filter(User.created_at >= week_ago)
 
-            users = query.offset((page - 1) * per_page).limit(per_page).all()
-            return users, total_pages
+            total_pages = None
+            if after_id is None:
+                total_count = ids_query.count()
+                total_pages = (total_count + per_page - 1) // per_page
 
-    def get_premium_users(self) -> List[User]:
-        """Получить всех пользователей с активной Premium подпиской."""
-        with self.get_session() as session:
-            users = (
-                session.query(User)
-                .options(joinedload(User.subscription))
-                .join(Subscription)
-                .filter(
-                    Subscription.subscription_type == SubscriptionType.PREMIUM,
-                    Subscription.status == SubscriptionStatus.ACTIVE,
-                    (Subscription.end_date == None)
-                    | (Subscription.end_date > datetime.utcnow()),
-                )
+            ids_query = ids_query.order_by(User.id)
+            if after_id is not None:
+                ids_query = ids_query.filter(User.id > after_id)
+            else:
+                ids_query = ids_query.offset((page - 1) * per_page)
+            page_ids = ids_query.limit(per_page).subquery()
+
+            # Deferred join: колонки списка читаются только для строк страницы
+            rows = (
+                self._user_list_query(session)
+                .join(page_ids, User.id == page_ids.c.id)
+                .order_by(User.id)
                 .all()
             )
-            return users
+            users = _to_user_list_rows(rows)
+
+            if after_id is None:
+                return users, total_pages
+            # Неполная страница — последняя
+            next_cursor = users[-1].id if len(users) == per_page else None
+            return users, next_cursor
+
+    def get_premium_users(self) -> List[UserListRow]:
+        """Получить всех пользователей с активной Premium подпиской."""
+        with self.get_read_session() as session:
+            rows = self._user_list_query(session).filter(_active_premium_clause()).all()
+            return _to_user_list_rows(rows)
 
-    def get_expiring_subscriptions(self, days: int = 7) -> List[User]:
+    def get_expiring_subscriptions(self, days: int = 7) -> List[UserListRow]:
         """Получить пользователей с истекающими подписками."""
-        with self.get_session() as session:
+        with self.get_read_session() as session:
             cutoff_date = datetime.utcnow() + timedelta(days=days)
-            users = (
-                session.query(User)
-                .options(joinedload(User.subscription))
-                .join(Subscription)
+            rows = (
+                self._user_list_query(session)
                 .filter(
-                    Subscription.subscription_type == SubscriptionType.PREMIUM,
-                    Subscription.status == SubscriptionStatus.ACTIVE,
-                    Subscription.end_date.isnot(None),
+                    _active_premium_clause(),
                     Subscription.end_date <= cutoff_date,
-                    Subscription.end_date > datetime.utcnow(),
                 )
                 .all()
             )
-            return users
+            return _to_user_list_rows(rows)
+
+    @staticmethod
+    def _user_list_query(session: Session):
+        """Узкий SELECT колонок для списков пользователей, подписка через LEFT JOIN"""
+        return session.query(
+            User.id,
+            User.telegram_id,
+            User.name,
+            User.created_at,
+            Subscription.subscription_type,
+            Subscription.end_date,
+            _active_premium_clause().label("is_premium"),
+        ).outerjoin(Subscription, Subscription.user_id == User.id)
 
     def get_user_activity(self, telegram_id: int) -> Dict[str, Any]:
         """Получить детальную информацию об активности пользователя."""
-        with self.get_session() as session:
-            user = (
-                session.query(User)
-                .options(
-                    joinedload(User.subscription),
-                    joinedload(User.natal_charts),
-                    joinedload(User.predictions),
+        with self.get_read_session() as session:
+            # Коллекции не загружаем: счетчики и последние даты считает СУБД
+            def _scalar(model, aggregate):
+                return (
+                    select(aggregate)
+                    .where(model.user_id == User.id)
+                    .scalar_subquery()
+                )
+
+            row = (
+                session.query(
+                    User.created_at,
+                    User.is_profile_complete,
+                    User.notifications_enabled,
+                    _scalar(NatalChart, func.count(NatalChart.id)).label("charts_count"),
+                    _scalar(NatalChart, func.max(NatalChart.created_at)).label(
+                        "last_chart_date"
+                    ),
+                    _scalar(Prediction, func.count(Prediction.id)).label(
+                        "predictions_count"
+                    ),
+                    _scalar(Prediction, func.max(Prediction.created_at)).label(
+                        "last_prediction_date"
+                    ),
                 )
                 .filter(User.telegram_id == telegram_id)
                 .first()
             )
 
-            if not user:
+            if not row:
                 return {}
 
             return {
-                "charts_count": len(user.natal_charts),
-                "predictions_count": len(user.predictions),
-                "last_chart_date": (
-                    user.natal_charts[-1].created_at if user.natal_charts else None
-                ),
-                "last_prediction_date": (
-                    user.predictions[-1].created_at if user.predictions else None
-                ),
-                "registration_date": user.created_at,
-                "profile_complete": user.is_profile_complete,
-                "notifications_enabled": user.notifications_enabled,
+                "charts_count": row.charts_count,
+                "predictions_count": row.predictions_count,
+                "last_chart_date": row.last_chart_date,
+                "last_prediction_date": row.last_prediction_date,
+                "registration_date": row.created_at,
+                "profile_complete": row.is_profile_complete,
+                "notifications_enabled": row.notifications_enabled,
             }
 
-    def get_detailed_statistics(self) -> Dict[str, Any]:
-        """Получить подробную статистику системы."""
-        with self.get_session() as session:
-            # Базовая статистика
-            total_users = session.query(func.count(User.id)).scalar()
-            total_charts = session.query(func.count(NatalChart.id)).scalar()
-            total_predictions = session.query(func.count(Prediction.id)).scalar()
-
-            # Статистика по дням
-            today_start = datetime.utcnow().replace(
-                hour=0, minute=0, second=0, microsecond=0
-            )
-            yesterday_start = today_start - timedelta(days=1)
-            week_ago = today_start - timedelta(days=7)
-            month_ago = today_start - timedelta(days=30)
+    def get_detailed_statistics(
+        self, force_fresh: bool = False, max_age: timedelta = STATS_SNAPSHOT_MAX_AGE
+    ) -> Dict[str, Any]:
+        """Получить подробную статистику системы.
 
-            new_users_today = (
-                session.query(func.count(User.id))
-                .filter(User.created_at >= today_start)
-                .scalar()
-            )
-            new_users_yesterday = (
-                session.query(func.count(User.id))
-                .filter(
-                    User.created_at >= yesterday_start, User.created_at < today_start
-                )
-                .scalar()
-            )
-            new_users_week = (
-                session.query(func.count(User.id))
-                .filter(User.created_at >= week_ago)
-                .scalar()
-            )
-            new_users_month = (
-                session.query(func.count(User.id))
-                .filter(User.created_at >= month_ago)
-                .scalar()
-            )
-
-            # Статистика подписок
-            active_premium = (
-                session.query(func.count(Subscription.id))
-                .filter(
-                    Subscription.subscription_type == SubscriptionType.PREMIUM,
-                    Subscription.status == SubscriptionStatus.ACTIVE,
-                    (Subscription.end_date == None)
-                    | (Subscription.end_date > datetime.utcnow()),
+        Читается последний StatsSnapshot; если он старше max_age (или force_fresh),
+        счетчики пересчитываются и сохраняются новым снимком.
+        """
+        if not force_fresh:
+            with self.get_read_session() as session:
+                snapshot = (
+                    session.query(StatsSnapshot)
+                    .filter(StatsSnapshot.captured_at >= datetime.utcnow() - max_age)
+                    .order_by(StatsSnapshot.captured_at.desc())
+                    .first()
                 )
-                .scalar()
-            )
+            if snapshot is not None:
+                return snapshot.to_statistics()
 
-            expired_premium = (
-                session.query(func.count(Subscription.id))
-                .filter(
-                    Subscription.subscription_type == SubscriptionType.PREMIUM,
-                    Subscription.status == SubscriptionStatus.EXPIRED,
-                )
-                .scalar()
-            )
+        return self.refresh_stats_snapshot().to_statistics()
 
+    def refresh_stats_snapshot(self) -> StatsSnapshot:
+        """Пересчитать счетчики статистики и сохранить их новым снимком"""
+        today_start = datetime.utcnow().replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        yesterday_start = today_start - timedelta(days=1)
+        week_ago = today_start - timedelta(days=7)
+        month_ago = today_start - timedelta(days=30)
+
+        # По одному агрегатному запросу на таблицу вместо COUNT на каждый срез
+        statements = (
+            select(
+                func.count(User.id),
+                _count_if(User.created_at >= today_start),
+                _count_if(
+                    and_(User.created_at >= yesterday_start, User.created_at < today_start)
+                ),
+                _count_if(User.created_at >= week_ago),
+                _count_if(User.created_at >= month_ago),
+            ),
+            # Статистика подписок
+            select(
+                _count_if(_active_premium_clause()),
+                _count_if(Subscription.status == SubscriptionStatus.EXPIRED),
+            ).where(Subscription.subscription_type == SubscriptionType.PREMIUM),
             # Активность
-            charts_today = (
-                session.query(func.count(NatalChart.id))
-                .filter(NatalChart.created_at >= today_start)
-                .scalar()
-            )
-            charts_week = (
-                session.query(func.count(NatalChart.id))
-                .filter(NatalChart.created_at >= week_ago)
-                .scalar()
-            )
+            select(
+                func.count(NatalChart.id),
+                _count_if(NatalChart.created_at >= today_start),
+                _count_if(NatalChart.created_at >= week_ago),
+            ),
+            select(
+                func.count(Prediction.id),
+                _count_if(Prediction.created_at >= today_start),
+                _count_if(Prediction.created_at >= week_ago),
+            ),
+        )
 
-            predictions_today = (
-                session.query(func.count(Prediction.id))
-                .filter(Prediction.created_at >= today_start)
-                .scalar()
-            )
-            predictions_week = (
-                session.query(func.count(Prediction.id))
-                .filter(Prediction.created_at >= week_ago)
-                .scalar()
+        # Запросы независимы: на сетевой СУБД выполняем их параллельно, каждый в своем
+        # соединении. SQLite работает в процессе, а :memory: у каждого потока своя
+        if self.engine.dialect.name == "sqlite":
+            results = [self._fetch_one_row(stmt) for stmt in statements]
+        else:
+            with ThreadPoolExecutor(max_workers=len(statements)) as executor:
+                results = list(executor.map(self._fetch_one_row, statements))
+
+        (
+            (
+                total_users,
+                new_users_today,
+                new_users_yesterday,
+                new_users_week,
+                new_users_month,
+            ),
+            (active_premium, expired_premium),
+            (total_charts, charts_today, charts_week),
+            (total_predictions, predictions_today, predictions_week),
+        ) = results
+
+        with self.get_session() as session:
+            snapshot = StatsSnapshot(
+                total_users=total_users,
+                users_today=new_users_today,
+                users_yesterday=new_users_yesterday,
+                users_week=new_users_week,
+                users_month=new_users_month,
+                active_premium=active_premium,
+                expired_premium=expired_premium,
+                total_charts=total_charts,
+                charts_today=charts_today,
+                charts_week=charts_week,
+                total_predictions=total_predictions,
+                predictions_today=predictions_today,
+                predictions_week=predictions_week,
             )
+            # Хранится только последний снимок
+            session.query(StatsSnapshot).delete(synchronize_session=False)
+            session.add(snapshot)
+            session.commit()
+            return snapshot
 
-            return {
-                "users": {
-                    "total": total_users,
-                    "today": new_users_today,
-                    "yesterday": new_users_yesterday,
-                    "week": new_users_week,
-                    "month": new_users_month,
-                },
-                "subscriptions": {
-                    "active_premium": active_premium,
-                    "expired_premium": expired_premium,
-                    "conversion_rate": (
-                        round((active_premium / total_users * 100), 2)
-                        if total_users > 0
-                        else 0
-                    ),
-                },
-                "content": {
-                    "total_charts": total_charts,
-                    "charts_today": charts_today,
-                    "charts_week": charts_week,
-                    "total_predictions": total_predictions,
-                    "predictions_today": predictions_today,
-                    "predictions_week": predictions_week,
-                },
-            }
+    def _fetch_one_row(self, stmt) -> Any:
+        """Выполнить запрос в отдельной read-сессии и вернуть единственную строку"""
+        with self.get_read_session() as session:
+            return session.execute(stmt).one()
 
     def bulk_extend_premium(self, user_ids: List[int], days: int) -> int:
         """Массовое продление Premium подписки."""
         with self.get_session() as session:
-            count = 0
-            for user_id in user_ids:
-                user = session.query(User).filter(User.telegram_id == user_id).first()
-                if user and user.subscription:
-                    sub = user.subscription
-                    if (
-                        sub.subscription_type == SubscriptionType.PREMIUM
-                        and sub.is_active
-                    ):
-                        if sub.end_date:
-                            sub.end_date += timedelta(days=days)
-                        else:
-                            sub.end_date = datetime.utcnow() + timedelta(days=days)
-                        count += 1
+            # Один SELECT активных Premium-подписок вместо запроса на каждого пользователя
+            rows = (
+                session.query(Subscription.id, Subscription.end_date)
+                .join(User, User.id == Subscription.user_id)
+                .filter(
+                    User.telegram_id.in_(user_ids),
+                    _active_premium_clause(),
+                )
+                .all()
+            )
+            if not rows:
+                return 0
 
-            if count > 0:
-                session.commit()
-            return count
+            # Сдвиг дат считаем в Python: интервальная арифметика в SQL
+            # у SQLite и PostgreSQL разная; запись — одним executemany по PK
+            now = datetime.utcnow()
+            delta = timedelta(days=days)
+            session.bulk_update_mappings(
+                Subscription,
+                [
+                    {"id": sub_id, "end_date": (end_date or now) + delta}
+                    for sub_id, end_date in rows
+                ],
+            )
+            session.commit()
+            self._invalidate_stats()
+            return len(rows)
 
     def cleanup_database(self) -> Dict[str, int]:
         """Очистка базы данных от устаревших данных."""
         with self.get_session() as session:
+            now = datetime.utcnow()
+
             # Удаляем истекшие прогнозы старше 30 дней
-            month_ago = datetime.utcnow() - timedelta(days=30)
+            month_ago = now - timedelta(days=30)
             expired_predictions = (
                 session.query(Prediction)
                 .filter(Prediction.valid_until < month_ago)
-                .delete()
+                .delete(synchronize_session=False)
             )
 
-            # Обновляем статус истекших подписок
+            # Обновляем статус истекших подписок одним UPDATE в той же транзакции
             expired_subs = (
                 session.query(Subscription)
-                .filter(
-                    Subscription.status == SubscriptionStatus.ACTIVE,
-                    Subscription.end_date.isnot(None),
-                    Subscription.end_date <= datetime.utcnow(),
+                .filter(_expired_premium_clause())
+                .update(
+                    {Subscription.status: SubscriptionStatus.EXPIRED},
+                    synchronize_session=False,
                 )
-                .all()
             )
 
-            for sub in expired_subs:
-                sub.status = SubscriptionStatus.EXPIRED
-                sub.updated_at = datetime.utcnow()
-
             session.commit()
+            self._invalidate_stats()
 
             return {
                 "expired_predictions_removed": expired_predictions,
-                "subscriptions_expired": len(expired_subs),
+                "subscriptions_expired": expired_subs,
             }
 
 
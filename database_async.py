@@ -6,15 +6,21 @@
 import asyncio
 import json
 import logging
+import time
 from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from dataclasses import asdict, is_dataclass
 from datetime import datetime, timedelta
 from functools import wraps
 from typing import Any, Dict, List, Optional, Tuple, Union
 
-from sqlalchemy import select, update, delete, func, and_, or_
+from sqlalchemy import Row, select, insert, update, delete, event, func, and_
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import contains_eager, joinedload, raiseload
+from sqlalchemy.orm.attributes import set_committed_value
 
 from database import (
     User,
@@ -25,56 +31,142 @@ from database import (
     SubscriptionType,
     CompatibilityReport,
     Base,
+    _active_premium_clause,
+    _count_if,
+    _expired_premium_clause,
+    _set_sqlite_pragmas,
+    _to_user_list_rows,
 )
+from models import SubscriptionRow, UserListRow, UserProfileRow
 
 logger = logging.getLogger(__name__)
 
 
+def _user_id_subq(telegram_id: int):
+    """Скалярный подзапрос id пользователя по telegram_id"""
+    return select(User.id).where(User.telegram_id == telegram_id).scalar_subquery()
+
+
+def _to_profile_row(user: User) -> UserProfileRow:
+    """Скопировать профиль и подписку в неизменяемый UserProfileRow"""
+    subscription = user.subscription
+    return UserProfileRow(
+        id=user.id,
+        telegram_id=user.telegram_id,
+        name=user.name,
+        gender=user.gender,
+        birth_year=user.birth_year,
+        birth_city=user.birth_city,
+        birth_date=user.birth_date,
+        birth_time_specified=user.birth_time_specified,
+        is_profile_complete=user.is_profile_complete,
+        notifications_enabled=user.notifications_enabled,
+        created_at=user.created_at,
+        subscription=(
+            SubscriptionRow(
+                subscription_type=subscription.subscription_type.value,
+                status=subscription.status.value,
+                start_date=subscription.start_date,
+                end_date=subscription.end_date,
+            )
+            if subscription is not None
+            else None
+        ),
+    )
+
+
+# INSERT с ON CONFLICT для поддерживаемых диалектов; остальные идут через SAVEPOINT
+_DIALECT_INSERTS = {
+    "sqlite": sqlite_insert,
+    "postgresql": postgresql_insert,
+}
+
+# Кэш профиля и подписки по telegram_id: время жизни записи и предельный размер
+USER_CACHE_TTL = 30.0
+USER_CACHE_MAXSIZE = 10_000
+
+
+# Открытая сессия: (менеджер, сессия, задача-владелец). ContextVar, а не атрибут
+# менеджера — у параллельных задач asyncio свои сессии. Задача, созданная внутри
+# блока (create_task, gather), копирует контекст, но владельцем не является
+_current_session: ContextVar[
+    Optional[Tuple[Any, AsyncSession, Optional[asyncio.Task]]]
+] = ContextVar("current_session", default=None)
+
+
 def with_db_session(func):
     """
     Декоратор для автоматического управления сессиями БД.
     Применяет принцип DRY - избавляет от повторяющегося кода создания сессий.
+    Если задача уже внутри сессии этого менеджера (вложенный вызов или
+    db_session_context), метод работает в ней, без второй транзакции.
     
     Использование:
     @with_db_session
     async def my_method(self, user_id: int) -> User:
-        # self.session уже доступна
-        result = await self.session.execute(select(User).where(User.telegram_id == user_id))
+        # self._session уже доступна
+        result = await self._session.execute(select(User).where(User.telegram_id == user_id))
         return result.scalar_one_or_none()
     """
     @wraps(func)
     async def wrapper(self, *args, **kwargs):
+        if self._session is not None:
+            return await func(self, *args, **kwargs)
+
         async with self.get_session() as session:
-            # Временно заменяем session в self
-            original_session = getattr(self, '_session', None)
-            self._session = session
-            
+            token = _current_session.set((self, session, asyncio.current_task()))
             try:
-                result = await func(self, *args, **kwargs)
-                return result
+                return await func(self, *args, **kwargs)
             finally:
-                # Восстанавливаем оригинальную сессию если была
-                if original_session is not None:
-                    self._session = original_session
-                else:
-                    delattr(self, '_session')
+                _current_session.reset(token)
     
     return wrapper
 
 
+def invalidates_user_cache(all_users: bool = False):
+    """
+    Декоратор: сбросить кэш пользователя после выполнения метода.
+    Ставится над @with_db_session, чтобы сброс шел уже после commit —
+    иначе параллельный запрос успеет закэшировать старые данные.
+    telegram_id берется из первого аргумента; all_users=True сбрасывает весь кэш.
+    """
+    def decorator(method):
+        @wraps(method)
+        async def wrapper(self, *args, **kwargs):
+            telegram_id = None if all_users else kwargs.get("telegram_id", args[0] if args else None)
+            try:
+                return await method(self, *args, **kwargs)
+            finally:
+                self._invalidate_user_after_commit(telegram_id)
+
+        return wrapper
+
+    return decorator
+
+
 @asynccontextmanager
 async def db_session_context(db_manager):
     """
     Контекстный менеджер для работы с сессиями БД.
     Альтернатива декоратору для случаев, когда нужен более явный контроль.
+    Методы менеджера, вызванные внутри блока, выполняются в этой же сессии —
+    несколько операций идут одной транзакцией.
     
     Использование:
     async with db_session_context(db_manager) as session:
         result = await session.execute(select(User))
         return result.scalars().all()
     """
+    if db_manager._session is not None:
+        yield db_manager._session
+        return
+
     async with db_manager.get_session() as session:
-        yield session
+        token = _current_session.set((db_manager, session, asyncio.current_task()))
+        try:
+            yield session
+        finally:
+            _current_session.reset(token)
 
 
 class AsyncDatabaseManager:
@@ -86,8 +178,14 @@ class AsyncDatabaseManager:
         self.database_url = database_url or Config.DATABASE_URL
         self.engine = None
         self.session_factory = None
-        self._session = None
         self.db_config = Config.get_database_config()
+        self.strict_loading = Config.DB_STRICT_LOADING
+
+        # telegram_id -> (время записи, значение); None-результаты не кэшируются
+        self._profile_cache: Dict[int, Tuple[float, Any]] = {}
+        self._subscription_cache: Dict[int, Tuple[float, Any]] = {}
+        # Растет при каждом сбросе: результат запроса, начатого до сброса, не кэшируется
+        self._user_cache_epoch = 0
 
     async def init_db(self):
         """Инициализация базы данных"""
@@ -95,6 +193,10 @@ class AsyncDatabaseManager:
             self.database_url,
             **self.db_config
         )
+        # Файловая SQLite и так получает AsyncAdaptedQueuePool (5 + 10 overflow),
+        # не хватает только PRAGMA (WAL и т.д.) на каждом новом соединении
+        if self.engine.dialect.name == "sqlite":
+            event.listen(self.engine.sync_engine, "connect", _set_sqlite_pragmas)
         
         self.session_factory = async_sessionmaker(
             self.engine,
@@ -121,6 +223,66 @@ class AsyncDatabaseManager:
                 await session.rollback()
                 raise
 
+    @property
+    def _session(self) -> Optional[AsyncSession]:
+        """Сессия, открытая текущей задачей для этого менеджера, или None"""
+        current = _current_session.get()
+        if current is None:
+            return None
+        manager, session, owner = current
+        # Дочерняя задача не берет сессию родителя: та может быть уже закрыта
+        if manager is self and owner is asyncio.current_task():
+            return session
+        return None
+
+    def _load_options(self, *options):
+        """Явные загрузки связей + raiseload('*') для всех остальных (если strict_loading)"""
+        if self.strict_loading:
+            return (*options, raiseload("*"))
+        return options
+
+    # === КЭШ ПОЛЬЗОВАТЕЛЕЙ ===
+
+    def invalidate_user(self, telegram_id: Optional[int] = None) -> None:
+        """Сбросить кэш профиля и подписки пользователя (без telegram_id — весь кэш)"""
+        self._user_cache_epoch += 1
+        if telegram_id is None:
+            self._profile_cache.clear()
+            self._subscription_cache.clear()
+        else:
+            self._profile_cache.pop(telegram_id, None)
+            self._subscription_cache.pop(telegram_id, None)
+
+    def _invalidate_user_after_commit(self, telegram_id: Optional[int] = None) -> None:
+        """Сбросить кэш сейчас и, если сессия еще открыта, повторно после ее commit"""
+        self.invalidate_user(telegram_id)
+        if self._session is not None:
+            event.listen(
+                self._session.sync_session,
+                "after_commit",
+                lambda _session: self.invalidate_user(telegram_id),
+                once=True,
+            )
+
+    @staticmethod
+    def _cache_lookup(cache: Dict[int, Tuple[float, Any]], telegram_id: int) -> Any:
+        """Значение из кэша или None, если записи нет или она устарела"""
+        entry = cache.get(telegram_id)
+        if entry is not None and time.monotonic() - entry[0] < USER_CACHE_TTL:
+            return entry[1]
+        return None
+
+    def _cache_store(
+        self, cache: Dict[int, Tuple[float, Any]], telegram_id: int, value: Any, epoch: int
+    ) -> None:
+        """Положить значение в кэш, если с начала запроса не было сброса"""
+        if value is None or epoch != self._user_cache_epoch:
+            return
+        if len(cache) >= USER_CACHE_MAXSIZE and telegram_id not in cache:
+            # Вытесняем самую старую запись (dict хранит порядок вставки)
+            cache.pop(next(iter(cache)))
+        cache[telegram_id] = (time.monotonic(), value)
+
     # === ПОЛЬЗОВАТЕЛИ ===
 
     @with_db_session
@@ -134,23 +296,75 @@ class AsyncDatabaseManager:
         if user:
             return user, False
         
-        user = User(telegram_id=telegram_id, name=name)
-        self._session.add(user)
-        await self._session.flush()
-        await self._session.refresh(user)
+        # INSERT ... ON CONFLICT DO NOTHING RETURNING: параллельный запрос с тем же
+        # telegram_id не падает на UNIQUE, а получает пустой RETURNING
+        dialect_insert = _DIALECT_INSERTS.get(self.engine.dialect.name)
+        if dialect_insert is None:
+            user = await self._insert_user_in_savepoint(telegram_id, name)
+        else:
+            result = await self._session.execute(
+                dialect_insert(User)
+                .values(telegram_id=telegram_id, name=name)
+                .on_conflict_do_nothing(index_elements=[User.telegram_id])
+                .returning(User)
+            )
+            user = result.scalar_one_or_none()
+        
+        if user is None:
+            # Пользователя только что создал другой запрос — читаем его строку
+            result = await self._session.execute(
+                select(User).where(User.telegram_id == telegram_id)
+            )
+            return result.scalar_one(), False
+        
+        # У нового пользователя подписки нет: задаем явно, чтобы user.subscription
+        # читался после закрытия сессии без отдельного запроса
+        set_committed_value(user, "subscription", None)
         
         logger.info(f"✅ Пользователь создан: {user.name} (ID: {user.telegram_id})")
         return user, True
 
+    async def _insert_user_in_savepoint(self, telegram_id: int, name: str) -> Optional[User]:
+        """
+        Создать пользователя без ON CONFLICT (диалекты вне _DIALECT_INSERTS).
+        INSERT идет в SAVEPOINT: при конфликте UNIQUE откатывается только он,
+        а не вся транзакция. None — пользователя уже создал другой запрос.
+        """
+        user = User(telegram_id=telegram_id, name=name)
+        try:
+            async with self._session.begin_nested():
+                self._session.add(user)
+        except IntegrityError:
+            return None
+        return user
+
+    async def get_user_profile(self, telegram_id: int) -> Optional[UserProfileRow]:
+        """
+        Получить профиль пользователя с подпиской (кэшируется).
+        Возвращается неизменяемый UserProfileRow: один объект из кэша безопасно
+        отдавать всем вызывающим.
+        """
+        user = self._cache_lookup(self._profile_cache, telegram_id)
+        if user is not None:
+            return user
+
+        epoch = self._user_cache_epoch
+        user = await self._load_user_profile(telegram_id)
+        self._cache_store(self._profile_cache, telegram_id, user, epoch)
+        return user
+
     @with_db_session
-    async def get_user_profile(self, telegram_id: int) -> Optional[User]:
-        """Получить профиль пользователя с подгруженной подпиской"""
-        from sqlalchemy.orm import selectinload
+    async def _load_user_profile(self, telegram_id: int) -> Optional[UserProfileRow]:
+        """Загрузить профиль с подпиской из БД и скопировать в UserProfileRow"""
         result = await self._session.execute(
-            select(User).options(selectinload(User.subscription)).where(User.telegram_id == telegram_id)
+            select(User)
+            .options(*self._load_options(joinedload(User.subscription)))
+            .where(User.telegram_id == telegram_id)
         )
-        return result.scalar_one_or_none()
+        user = result.scalar_one_or_none()
+        return _to_profile_row(user) if user is not None else None
 
+    @invalidates_user_cache()
     @with_db_session
     async def set_notifications(self, telegram_id: int, enabled: bool) -> bool:
         """Включить или выключить уведомления для пользователя"""
@@ -161,11 +375,11 @@ class AsyncDatabaseManager:
         
         if user:
             user.notifications_enabled = enabled
-            await self._session.flush()
             logger.info(f"✅ Уведомления {'включены' if enabled else 'выключены'} для пользователя {telegram_id}")
             return True
         return False
 
+    @invalidates_user_cache()
     @with_db_session
     async def update_user_profile(
         self,
@@ -194,41 +408,31 @@ class AsyncDatabaseManager:
         user.birth_time_specified = birth_time_specified
         user.is_profile_complete = True
         
-        await self._session.flush()
-        await self._session.refresh(user)
-        
         logger.info(f"✅ Профиль обновлен: {user.name}")
         return user
 
+    @invalidates_user_cache()
     @with_db_session
     async def delete_user_data(self, telegram_id: int) -> bool:
         """Удалить все данные пользователя"""
-        # Получаем пользователя
+        # Без предварительного SELECT: дочерние строки удаляются по подзапросу id,
+        # прогнозы — раньше карт, на которые они ссылаются
+        user_id = _user_id_subq(telegram_id)
+        for model in (Prediction, NatalChart, CompatibilityReport, Subscription):
+            await self._session.execute(
+                delete(model)
+                .where(model.user_id == user_id)
+                .execution_options(synchronize_session=False)
+            )
+
         result = await self._session.execute(
-            select(User).where(User.telegram_id == telegram_id)
+            delete(User)
+            .where(User.telegram_id == telegram_id)
+            .execution_options(synchronize_session=False)
         )
-        user = result.scalar_one_or_none()
-        
-        if not user:
+        if not result.rowcount:
             return False
         
-        # Удаляем связанные данные
-        await self._session.execute(
-            delete(Prediction).where(Prediction.telegram_id == telegram_id)
-        )
-        await self._session.execute(
-            delete(NatalChart).where(NatalChart.telegram_id == telegram_id)
-        )
-        await self._session.execute(
-            delete(CompatibilityReport).where(CompatibilityReport.user_id == user.id)
-        )
-        await self._session.execute(
-            delete(Subscription).where(Subscription.telegram_id == telegram_id)
-        )
-        
-        # Удаляем пользователя
-        await self._session.delete(user)
-        
         logger.info(f"✅ Данные пользователя {telegram_id} удалены")
         return True
 
@@ -251,17 +455,16 @@ class AsyncDatabaseManager:
         chart_owner_name: str = None,
     ) -> NatalChart:
         """Создать натальную карту"""
-        # Получаем пользователя
-        user_result = await self._session.execute(
-            select(User).where(User.telegram_id == telegram_id)
+        # Нужен только id пользователя — ORM-объект User не загружаем
+        user_id = await self._session.scalar(
+            select(User.id).where(User.telegram_id == telegram_id)
         )
-        user = user_result.scalar_one_or_none()
         
-        if not user:
+        if user_id is None:
             raise ValueError(f"Пользователь с telegram_id {telegram_id} не найден")
         
         chart = NatalChart(
-            user_id=user.id,
+            user_id=user_id,
             chart_type=chart_type,
             chart_owner_name=chart_owner_name,
             city=city,
@@ -289,7 +492,6 @@ class AsyncDatabaseManager:
         
         self._session.add(chart)
         await self._session.flush()
-        await self._session.refresh(chart)
         
         logger.info(f"✅ Натальная карта создана: {name}")
         return chart
@@ -300,6 +502,7 @@ class AsyncDatabaseManager:
         result = await self._session.execute(
             select(NatalChart)
             .join(User)
+            .options(*self._load_options())
             .where(User.telegram_id == telegram_id)
             .order_by(NatalChart.created_at.desc())
         )
@@ -336,6 +539,24 @@ class AsyncDatabaseManager:
         logger.info(f"✅ Натальная карта {chart_id} удалена")
         return True
 
+    @with_db_session
+    async def create_natal_charts_bulk(self, records: List[Dict[str, Any]]) -> List[int]:
+        """
+        Создать несколько натальных карт одним INSERT через Core.
+        records — значения колонок natal_charts (user_id и уже сериализованные
+        planets_data); возвращает id в порядке records.
+        """
+        if not records:
+            return []
+
+        result = await self._session.execute(
+            NatalChart.__table__.insert().returning(
+                NatalChart.id, sort_by_parameter_order=True
+            ),
+            records,
+        )
+        return list(result.scalars())
+
     # === ПРОГНОЗЫ ===
 
     @with_db_session
@@ -350,17 +571,16 @@ class AsyncDatabaseManager:
         generation_time: float = 0.0,
     ) -> Prediction:
         """Создать прогноз"""
-        # Получаем пользователя
-        user_result = await self._session.execute(
-            select(User).where(User.telegram_id == telegram_id)
+        # Нужен только id пользователя — ORM-объект User не загружаем
+        user_id = await self._session.scalar(
+            select(User.id).where(User.telegram_id == telegram_id)
         )
-        user = user_result.scalar_one_or_none()
         
-        if not user:
+        if user_id is None:
             raise ValueError(f"Пользователь с telegram_id {telegram_id} не найден")
         
         prediction = Prediction(
-            user_id=user.id,
+            user_id=user_id,
             natal_chart_id=chart_id,
             prediction_type=prediction_type,
             valid_from=valid_from,
@@ -371,11 +591,50 @@ class AsyncDatabaseManager:
         
         self._session.add(prediction)
         await self._session.flush()
-        await self._session.refresh(prediction)
         
         logger.info(f"✅ Прогноз создан: {prediction.prediction_type}")
         return prediction
 
+    @with_db_session
+    async def create_predictions_bulk(self, rows: List[Dict[str, Any]]) -> List[int]:
+        """
+        Создать несколько прогнозов одним INSERT ... RETURNING.
+        Ключи строк — аргументы create_prediction; возвращает id в порядке строк.
+        Большие пачки SQLAlchemy сам делит на INSERT по insertmanyvalues_page_size строк.
+        """
+        if not rows:
+            return []
+
+        # id всех пользователей пачки — одним запросом
+        telegram_ids = {row["telegram_id"] for row in rows}
+        result = await self._session.execute(
+            select(User.telegram_id, User.id).where(User.telegram_id.in_(telegram_ids))
+        )
+        user_ids = dict(result.all())
+        missing = telegram_ids - user_ids.keys()
+        if missing:
+            raise ValueError(f"Пользователи с telegram_id {sorted(missing)} не найдены")
+
+        result = await self._session.execute(
+            insert(Prediction).returning(Prediction.id, sort_by_parameter_order=True),
+            [
+                {
+                    "user_id": user_ids[row["telegram_id"]],
+                    "natal_chart_id": row["chart_id"],
+                    "prediction_type": row["prediction_type"],
+                    "valid_from": row["valid_from"],
+                    "valid_until": row["valid_until"],
+                    "content": row["content"],
+                    "generation_time": row.get("generation_time", 0.0),
+                }
+                for row in rows
+            ],
+        )
+        prediction_ids = list(result.scalars())
+
+        logger.info(f"✅ Создано прогнозов: {len(prediction_ids)}")
+        return prediction_ids
+
     @with_db_session
     async def find_valid_prediction(
         self, telegram_id: int, chart_id: int, prediction_type: str
@@ -403,6 +662,7 @@ class AsyncDatabaseManager:
         result = await self._session.execute(
             select(Prediction)
             .join(User)
+            .options(*self._load_options())
             .where(User.telegram_id == telegram_id)
             .order_by(Prediction.created_at.desc())
         )
@@ -413,49 +673,50 @@ class AsyncDatabaseManager:
     @with_db_session
     async def get_or_create_subscription(self, telegram_id: int) -> Subscription:
         """Получить или создать подписку пользователя"""
-        # Получаем пользователя
-        user_result = await self._session.execute(
-            select(User).where(User.telegram_id == telegram_id)
-        )
-        user = user_result.scalar_one_or_none()
-        
-        if not user:
-            raise ValueError(f"Пользователь с telegram_id {telegram_id} не найден")
-        
+        # Существующая подписка находится одним запросом, без отдельного SELECT User
         result = await self._session.execute(
-            select(Subscription).where(Subscription.user_id == user.id)
+            select(Subscription).where(Subscription.user_id == _user_id_subq(telegram_id))
         )
         subscription = result.scalar_one_or_none()
         
         if subscription:
             return subscription
         
+        user_id = await self._session.scalar(
+            select(User.id).where(User.telegram_id == telegram_id)
+        )
+        
+        if user_id is None:
+            raise ValueError(f"Пользователь с telegram_id {telegram_id} не найден")
+        
         subscription = Subscription(
-            user_id=user.id,
+            user_id=user_id,
             subscription_type=SubscriptionType.FREE,
             status=SubscriptionStatus.ACTIVE,
         )
         
         self._session.add(subscription)
         await self._session.flush()
-        await self._session.refresh(subscription)
+        # Кэш сбрасываем только при создании: в закэшированном профиле подписки еще нет
+        self._invalidate_user_after_commit(telegram_id)
         
         logger.info(f"✅ Подписка создана для пользователя {telegram_id}")
         return subscription
 
-    @with_db_session
     async def get_subscription_info(self, telegram_id: int) -> Optional[Dict[str, Any]]:
-        """Получить информацию о подписке пользователя"""
-        user_result = await self._session.execute(
-            select(User).where(User.telegram_id == telegram_id)
-        )
-        user = user_result.scalar_one_or_none()
-        
-        if not user:
-            return None
-        
+        """Получить информацию о подписке пользователя (кэшируется)"""
+        info = self._cache_lookup(self._subscription_cache, telegram_id)
+        if info is None:
+            epoch = self._user_cache_epoch
+            info = await self._load_subscription_info(telegram_id)
+            self._cache_store(self._subscription_cache, telegram_id, info, epoch)
+        return dict(info) if info is not None else None
+
+    @with_db_session
+    async def _load_subscription_info(self, telegram_id: int) -> Optional[Dict[str, Any]]:
+        """Прочитать информацию о подписке из БД"""
         subscription_result = await self._session.execute(
-            select(Subscription).where(Subscription.user_id == user.id)
+            select(Subscription).where(Subscription.user_id == _user_id_subq(telegram_id))
         )
         subscription = subscription_result.scalar_one_or_none()
         
@@ -475,27 +736,27 @@ class AsyncDatabaseManager:
             "payment_currency": subscription.payment_currency,
         }
 
+    @invalidates_user_cache()
     @with_db_session
     async def create_premium_subscription(
         self, telegram_id: int, duration_days: int = 30, payment_id: str = None, payment_amount: float = None
     ) -> Subscription:
         """Создать Premium подписку"""
-        # Получаем пользователя
-        user_result = await self._session.execute(
-            select(User).where(User.telegram_id == telegram_id)
+        # Нужен только id пользователя — ORM-объект User не загружаем
+        user_id = await self._session.scalar(
+            select(User.id).where(User.telegram_id == telegram_id)
         )
-        user = user_result.scalar_one_or_none()
         
-        if not user:
+        if user_id is None:
             raise ValueError(f"Пользователь с telegram_id {telegram_id} не найден")
         
         # Удаляем существующую подписку если есть
         await self._session.execute(
-            delete(Subscription).where(Subscription.user_id == user.id)
+            delete(Subscription).where(Subscription.user_id == user_id)
         )
         
         subscription = Subscription(
-            user_id=user.id,
+            user_id=user_id,
             subscription_type=SubscriptionType.PREMIUM,
             status=SubscriptionStatus.ACTIVE,
             end_date=datetime.utcnow() + timedelta(days=duration_days),
@@ -506,25 +767,16 @@ class AsyncDatabaseManager:
         
         self._session.add(subscription)
         await self._session.flush()
-        await self._session.refresh(subscription)
         
         logger.info(f"✅ Premium подписка создана для {telegram_id} на {duration_days} дней")
         return subscription
 
+    @invalidates_user_cache()
     @with_db_session
     async def revoke_premium_subscription(self, telegram_id: int) -> bool:
         """Отозвать Premium подписку"""
-        # Получаем пользователя
-        user_result = await self._session.execute(
-            select(User).where(User.telegram_id == telegram_id)
-        )
-        user = user_result.scalar_one_or_none()
-        
-        if not user:
-            return False
-        
         result = await self._session.execute(
-            select(Subscription).where(Subscription.user_id == user.id)
+            select(Subscription).where(Subscription.user_id == _user_id_subq(telegram_id))
         )
         subscription = result.scalar_one_or_none()
         
@@ -546,14 +798,22 @@ class AsyncDatabaseManager:
     # === СОВМЕСТИМОСТЬ ===
 
     @with_db_session
-    async def get_user_compatibility_reports(self, user_id: int) -> List[CompatibilityReport]:
-        """Получить отчеты по совместимости пользователя"""
+    async def get_user_compatibility_reports(self, user_id: int) -> List[Row]:
+        """Получить список отчетов по совместимости (без текста отчета)"""
+        # Строки Core вместо ORM-объектов: для списка нужны только эти колонки,
+        # report_text читает get_compatibility_report_by_id
         result = await self._session.execute(
-            select(CompatibilityReport)
+            select(
+                CompatibilityReport.id,
+                CompatibilityReport.sphere,
+                CompatibilityReport.user_name,
+                CompatibilityReport.partner_name,
+                CompatibilityReport.created_at,
+            )
             .where(CompatibilityReport.user_id == user_id)
             .order_by(CompatibilityReport.created_at.desc())
         )
-        return list(result.scalars().all())
+        return list(result.all())
 
     @with_db_session
     async def save_compatibility_report(
@@ -578,40 +838,41 @@ class AsyncDatabaseManager:
         )
         self._session.add(report)
         await self._session.flush()
-        await self._session.refresh(report)
         return report
 
+    @with_db_session
+    async def save_compatibility_reports_bulk(self, rows: List[Dict[str, Any]]) -> List[int]:
+        """
+        Сохранить несколько отчетов одним INSERT ... RETURNING.
+        Ключи строк — аргументы save_compatibility_report; возвращает id в порядке строк.
+        """
+        if not rows:
+            return []
+
+        result = await self._session.execute(
+            insert(CompatibilityReport).returning(
+                CompatibilityReport.id, sort_by_parameter_order=True
+            ),
+            rows,
+        )
+        return list(result.scalars())
+
     @with_db_session
     async def get_compatibility_report_by_id(
         self, report_id: int, user_id: int
     ) -> Optional[CompatibilityReport]:
         """Получить отчет о совместимости по ID с проверкой владельца"""
-        result = await self._session.execute(
-            select(CompatibilityReport).where(
-                and_(
-                    CompatibilityReport.id == report_id,
-                    CompatibilityReport.user_id == user_id
-                )
-            )
-        )
-        return result.scalar_one_or_none()
+        # Поиск по PK через identity map, владельца проверяем в Python
+        report = await self._session.get(CompatibilityReport, report_id)
+        return report if report is not None and report.user_id == user_id else None
 
     @with_db_session
     async def delete_compatibility_report(self, report_id: int, user_id: int) -> bool:
         """Удалить отчет о совместимости по ID с проверкой владельца"""
-        result = await self._session.execute(
-            select(CompatibilityReport).where(
-                and_(
-                    CompatibilityReport.id == report_id,
-                    CompatibilityReport.user_id == user_id
-                )
-            )
-        )
-        report = result.scalar_one_or_none()
-        
-        if report:
+        report = await self._session.get(CompatibilityReport, report_id)
+
+        if report is not None and report.user_id == user_id:
             await self._session.delete(report)
-            await self._session.flush()
             logger.info(f"✅ Отчет о совместимости {report_id} удален")
             return True
         return False
@@ -620,220 +881,197 @@ class AsyncDatabaseManager:
 
     @with_db_session
     async def get_users_paginated(
-        self, page: int = 1, per_page: int = 20, filter_type: str = "all"
-    ) -> Tuple[List[User], int]:
-        """Получить пользователей с пагинацией"""
-        offset = (page - 1) * per_page
-        
-        # Базовый запрос
-        base_query = select(User).options(selectinload(User.subscription))
-        
-        # Применяем фильтры
+        self,
+        page: int = 1,
+        per_page: int = 20,
+        filter_type: str = "all",
+        after_id: Optional[int] = None,
+    ) -> Tuple[List[User], Optional[int]]:
+        """
+        Получить пользователей с пагинацией.
+        Общее количество приходит в той же выборке через COUNT(*) OVER ().
+        after_id — keyset-курсор (id последнего пользователя предыдущей страницы):
+        страница читается по PK без OFFSET и COUNT, page не используется, total — None.
+        """
+        base_query = select(User).options(*self._load_options(joinedload(User.subscription)))
+        
+        # Применяем фильтры: EXISTS вместо JOIN, чтобы не дублировать JOIN от joinedload
         if filter_type == "premium":
-            base_query = base_query.join(Subscription).where(
-                Subscription.subscription_type == SubscriptionType.PREMIUM
+            base_query = base_query.where(
+                User.subscription.has(Subscription.subscription_type == SubscriptionType.PREMIUM)
             )
         elif filter_type == "free":
-            base_query = base_query.join(Subscription).where(
-                Subscription.subscription_type == SubscriptionType.FREE
+            base_query = base_query.where(
+                User.subscription.has(Subscription.subscription_type == SubscriptionType.FREE)
             )
         elif filter_type == "active":
-            base_query = base_query.where(User.last_activity >= datetime.utcnow() - timedelta(days=7))
-        
-        # Общее количество
-        count_result = await self._session.execute(
-            select(func.count()).select_from(base_query.subquery())
-        )
-        total_count = count_result.scalar()
-        
-        # Данные с пагинацией
+            # Пользователи за последние 7 дней (как в синхронном менеджере)
+            base_query = base_query.where(User.created_at >= datetime.utcnow() - timedelta(days=7))
+
+        base_query = base_query.order_by(User.id).limit(per_page)
+
+        if after_id is not None:
+            result = await self._session.execute(base_query.where(User.id > after_id))
+            return list(result.scalars().all()), None
+
         result = await self._session.execute(
-            base_query.offset(offset).limit(per_page)
+            base_query.add_columns(func.count().over().label("total"))
+            .offset((page - 1) * per_page)
         )
-        users = list(result.scalars().all())
-        
-        return users, total_count
+        rows = result.all()
+        total_count = rows[0].total if rows else 0
+        return [row[0] for row in rows], total_count
 
     @with_db_session
-    async def get_users_for_mailing(self) -> List[User]:
+    async def get_users_for_mailing(self) -> List[UserListRow]:
         """Получить пользователей для рассылки"""
+        # Узкий SELECT без ORM-гидратации: рассылке нужны telegram_id, имя и is_premium
         result = await self._session.execute(
-            select(User)
+            select(
+                User.id,
+                User.telegram_id,
+                User.name,
+                User.created_at,
+                Subscription.subscription_type,
+                Subscription.end_date,
+                _active_premium_clause().label("is_premium"),
+            )
+            .outerjoin(Subscription, Subscription.user_id == User.id)
             .where(User.notifications_enabled == True)
-            .options(selectinload(User.subscription))
         )
-        users = list(result.scalars().all())
-        logger.info(f"📋 get_users_for_mailing: найдено {len(users)} пользователей с включенными уведомлениями")
+        users = _to_user_list_rows(result.all())
+        logger.info(
+            "get_users_for_mailing: найдено %d пользователей с включенными уведомлениями",
+            len(users),
+        )
         
-        # Логируем детали пользователей для отладки
-        for user in users:
-            logger.info(f"👤 Пользователь для рассылки: ID={user.telegram_id}, имя='{user.name}', уведомления={user.notifications_enabled}")
+        # Список получателей — одной DEBUG-записью, а не INFO на каждого пользователя
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("mailing recipients: %s", [user.telegram_id for user in users])
         
         return users
 
     @with_db_session
     async def get_expiring_subscriptions(self, days: int = 7) -> List[User]:
         """Получить пользователей с истекающими подписками"""
-        expiry_date = datetime.utcnow() + timedelta(days=days)
+        now = datetime.utcnow()
+        expiry_date = now + timedelta(days=days)
         result = await self._session.execute(
             select(User)
             .join(Subscription)
+            .options(*self._load_options(contains_eager(User.subscription)))
             .where(
                 and_(
                     Subscription.subscription_type == SubscriptionType.PREMIUM,
                     Subscription.end_date <= expiry_date,
-                    Subscription.end_date > datetime.utcnow(),
+                    Subscription.end_date > now,
                 )
             )
         )
         return list(result.scalars().all())
 
+    @invalidates_user_cache(all_users=True)
     @with_db_session
     async def bulk_extend_premium(self, telegram_ids: List[int], days: int) -> int:
         """Массовое продление Premium подписок"""
-        count = 0
-        for telegram_id in telegram_ids:
-            # Получаем пользователя
-            user_result = await self._session.execute(
-                select(User).where(User.telegram_id == telegram_id)
-            )
-            user = user_result.scalar_one_or_none()
-            
-            if not user:
-                continue
-                
-            result = await self._session.execute(
-                select(Subscription).where(Subscription.user_id == user.id)
+        # Один UPDATE на сервере вместо загрузки и правки подписок по одной
+        base_date = func.coalesce(Subscription.end_date, datetime.utcnow())
+        if self.engine.dialect.name == "sqlite":
+            # В SQLite нет арифметики с интервалами — сдвигаем дату через strftime
+            new_end_date = func.strftime("%Y-%m-%d %H:%M:%f", base_date, f"+{int(days)} days")
+        else:
+            new_end_date = base_date + timedelta(days=days)
+
+        result = await self._session.execute(
+            update(Subscription)
+            .where(
+                and_(
+                    Subscription.user_id.in_(
+                        select(User.id).where(User.telegram_id.in_(telegram_ids))
+                    ),
+                    Subscription.subscription_type == SubscriptionType.PREMIUM,
+                )
             )
-            subscription = result.scalar_one_or_none()
-            
-            if subscription and subscription.subscription_type == SubscriptionType.PREMIUM:
-                if subscription.end_date:
-                    subscription.end_date += timedelta(days=days)
-                else:
-                    subscription.end_date = datetime.utcnow() + timedelta(days=days)
-                count += 1
-        
+            .values(end_date=new_end_date)
+            .execution_options(synchronize_session=False)
+        )
+        count = result.rowcount
+
         logger.info(f"✅ Продлено {count} Premium подписок")
         return count
 
     @with_db_session
     async def check_and_expire_subscriptions(self) -> int:
         """Проверить и истечь просроченные подписки"""
+        # Повторный запуск ничего не меняет: ACTIVE-строк с прошедшим end_date уже нет.
+        # Условие то же, что у синхронного менеджера, UPDATE идет по индексу
         result = await self._session.execute(
             update(Subscription)
-            .where(
-                and_(
-                    Subscription.subscription_type == SubscriptionType.PREMIUM,
-                    Subscription.end_date < datetime.utcnow(),
-                    Subscription.status == SubscriptionStatus.ACTIVE,
-                )
-            )
+            .where(_expired_premium_clause())
             .values(status=SubscriptionStatus.EXPIRED)
+            .execution_options(synchronize_session=False)
         )
         
         count = result.rowcount
+        # Кэш сбрасываем, только если что-то истекло: метод вызывается по расписанию
+        if count:
+            self._invalidate_user_after_commit()
         logger.info(f"✅ Истекло {count} подписок")
         return count
 
+    async def _fetch_statistics_row(self):
+        """Все счетчики админ-статистики одним SELECT"""
+        now = datetime.utcnow()
+        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        week_ago = now - timedelta(days=7)
+        month_ago = now - timedelta(days=30)
+
+        # Счетчики по users — одним проходом условной агрегацией
+        users = select(
+            func.count(User.id).label("total_users"),
+            _count_if(User.created_at >= today_start).label("new_users_today"),
+            _count_if(User.created_at >= week_ago).label("new_users_7_days"),
+            _count_if(User.created_at >= month_ago).label("new_users_30_days"),
+            _count_if(User.is_profile_complete == True).label("complete_profiles"),
+        ).subquery()
+
+        # Остальные таблицы — скалярными подзапросами в той же строке
+        result = await self._session.execute(
+            select(
+                users,
+                select(func.count(Subscription.id))
+                .where(_active_premium_clause())
+                .scalar_subquery()
+                .label("active_premium"),
+                select(func.count(NatalChart.id)).scalar_subquery().label("total_charts"),
+                select(func.count(Prediction.id)).scalar_subquery().label("total_predictions"),
+            )
+        )
+        return result.one()
+
     @with_db_session
     async def get_app_statistics(self) -> Dict[str, int]:
         """Получить статистику приложения"""
-        # Общее количество пользователей
-        total_users_result = await self._session.execute(select(func.count(User.id)))
-        total_users = total_users_result.scalar()
-        
-        # Новые пользователи сегодня
-        today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        today_users_result = await self._session.execute(
-            select(func.count(User.id)).where(User.created_at >= today_start)
-        )
-        new_users_today = today_users_result.scalar()
-        
-        # Новые пользователи за 7 дней
-        week_ago = datetime.utcnow() - timedelta(days=7)
-        week_users_result = await self._session.execute(
-            select(func.count(User.id)).where(User.created_at >= week_ago)
-        )
-        new_users_7_days = week_users_result.scalar()
-        
-        # Новые пользователи за 30 дней
-        month_ago = datetime.utcnow() - timedelta(days=30)
-        month_users_result = await self._session.execute(
-            select(func.count(User.id)).where(User.created_at >= month_ago)
-        )
-        new_users_30_days = month_users_result.scalar()
-        
-        # Активные Premium подписки
-        active_premium_result = await self._session.execute(
-            select(func.count(Subscription.id)).where(
-                and_(
-                    Subscription.subscription_type == SubscriptionType.PREMIUM,
-                    or_(
-                        Subscription.end_date > datetime.utcnow(),
-                        Subscription.end_date.is_(None)
-                    ),
-                    Subscription.status == SubscriptionStatus.ACTIVE,
-                )
-            )
-        )
-        active_premium = active_premium_result.scalar()
-        
-        # Общее количество натальных карт
-        total_charts_result = await self._session.execute(select(func.count(NatalChart.id)))
-        total_charts = total_charts_result.scalar()
-        
+        row = await self._fetch_statistics_row()
         return {
-            "total_users": total_users,
-            "new_users_today": new_users_today,
-            "new_users_7_days": new_users_7_days,
-            "new_users_30_days": new_users_30_days,
-            "active_premium": active_premium,
-            "total_charts": total_charts,
+            "total_users": row.total_users,
+            "new_users_today": row.new_users_today,
+            "new_users_7_days": row.new_users_7_days,
+            "new_users_30_days": row.new_users_30_days,
+            "active_premium": row.active_premium,
+            "total_charts": row.total_charts,
         }
 
     @with_db_session
     async def get_detailed_statistics(self) -> Dict[str, int]:
         """Получить детальную статистику для админ-панели"""
-        # Общее количество пользователей
-        total_users_result = await self._session.execute(select(func.count(User.id)))
-        total_users = total_users_result.scalar()
-        
-        # Пользователи с завершенным профилем
-        complete_profiles_result = await self._session.execute(
-            select(func.count(User.id)).where(User.is_profile_complete == True)
-        )
-        complete_profiles = complete_profiles_result.scalar()
-        
-        # Активные Premium подписки
-        active_premium_result = await self._session.execute(
-            select(func.count(Subscription.id)).where(
-                and_(
-                    Subscription.subscription_type == SubscriptionType.PREMIUM,
-                    or_(
-                        Subscription.end_date > datetime.utcnow(),
-                        Subscription.end_date.is_(None)
-                    ),
-                    Subscription.status == SubscriptionStatus.ACTIVE,
-                )
-            )
-        )
-        active_premium = active_premium_result.scalar()
-        
-        # Общее количество натальных карт
-        total_charts_result = await self._session.execute(select(func.count(NatalChart.id)))
-        total_charts = total_charts_result.scalar()
-        
-        # Общее количество прогнозов
-        total_predictions_result = await self._session.execute(select(func.count(Prediction.id)))
-        total_predictions = total_predictions_result.scalar()
-        
+        row = await self._fetch_statistics_row()
         return {
-            "total_users": total_users,
-            "complete_profiles": complete_profiles,
-            "active_premium": active_premium,
-            "total_charts": total_charts,
-            "total_predictions": total_predictions,
+            "total_users": row.total_users,
+            "complete_profiles": row.complete_profiles,
+            "active_premium": row.active_premium,
+            "total_charts": row.total_charts,
+            "total_predictions": row.total_predictions,
         }
 
     @with_db_session
@@ -862,14 +1100,7 @@ class AsyncDatabaseManager:
         # Активные Premium подписки
         active_premium_result = await self._session.execute(
             select(func.count(Subscription.id)).where(
-                and_(
-                    Subscription.subscription_type == SubscriptionType.PREMIUM,
-                    or_(
-                        Subscription.expires_at > datetime.utcnow(),
-                        Subscription.expires_at.is_(None)
-                    ),
-                    Subscription.status == SubscriptionStatus.ACTIVE,
-                )
+                _active_premium_clause()
             )
         )
         active_premium = active_premium_result.scalar()
@@ -926,15 +1157,18 @@ class AsyncDatabaseManager:
     @with_db_session
     async def cleanup_database(self) -> Dict[str, int]:
         """Очистка базы данных от устаревших данных"""
+        # Одна точка отсчета для обеих границ
+        now = datetime.utcnow()
+
         # Удаляем старые прогнозы (старше 30 дней)
-        month_ago = datetime.utcnow() - timedelta(days=30)
+        month_ago = now - timedelta(days=30)
         old_predictions_result = await self._session.execute(
             delete(Prediction).where(Prediction.created_at < month_ago)
         )
         deleted_predictions = old_predictions_result.rowcount
         
         # Удаляем старые отчеты о совместимости (старше 90 дней)
-        three_months_ago = datetime.utcnow() - timedelta(days=90)
+        three_months_ago = now - timedelta(days=90)
         old_reports_result = await self._session.execute(
             delete(CompatibilityReport).where(CompatibilityReport.created_at < three_months_ago)
         )
@@ -288,6 +288,8 @@ if __name__ == "__main__":
             print("Создайте .env файл и укажите BOT_TOKEN")
             sys.exit(1)
         
+        Config.bootstrap()
+        
         if not Config.ADMIN_IDS:
             print("⚠️  ПРЕДУПРЕЖДЕНИЕ: ADMIN_IDS не указаны")
         
@@ -37,3 +37,61 @@ class UserProfile:
     name: str
     birth_data: BirthData
     planets: Dict[str, PlanetPosition]
+
+
+@dataclass
+class UserListRow:
+    """Строка списка пользователей для админ-панели (без ORM-объектов)"""
+
+    id: int
+    telegram_id: int
+    name: str
+    created_at: Optional[datetime]
+    subscription_type: Optional[str]
+    end_date: Optional[datetime]
+    is_premium: bool
+
+
+@dataclass(frozen=True)
+class SubscriptionRow:
+    """Подписка из профиля пользователя (без ORM-объектов)"""
+
+    subscription_type: str
+    status: str
+    start_date: Optional[datetime]
+    end_date: Optional[datetime]
+
+    @property
+    def is_active(self) -> bool:
+        """Активна ли подписка на текущий момент"""
+        if self.status != "active":
+            return False
+        return self.end_date is None or datetime.utcnow() <= self.end_date
+
+    @property
+    def is_premium(self) -> bool:
+        """Действующая ли это Premium подписка"""
+        return self.subscription_type == "premium" and self.is_active
+
+
+@dataclass(frozen=True)
+class UserProfileRow:
+    """Профиль пользователя для кэша (без ORM-объектов, общий для всех вызывающих)"""
+
+    id: int
+    telegram_id: int
+    name: str
+    gender: Optional[str]
+    birth_year: Optional[int]
+    birth_city: Optional[str]
+    birth_date: Optional[datetime]
+    birth_time_specified: Optional[bool]
+    is_profile_complete: bool
+    notifications_enabled: bool
+    created_at: Optional[datetime]
+    subscription: Optional[SubscriptionRow]
+
+    @property
+    def is_premium(self) -> bool:
+        """Есть ли у пользователя активная Premium подписка"""
+        return self.subscription is not None and self.subscription.is_premium
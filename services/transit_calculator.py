@@ -14,24 +14,32 @@ logger = logging.getLogger(__name__)
 # Глобальная блокировка для Swiss Ephemeris (не потокобезопасен)
 swe_lock = threading.Lock()
 
+# Названия планет, индексированные номером Swiss Ephemeris (swe.SUN == 0 ... swe.PLUTO == 9)
+PLANET_NAMES: Tuple[str, ...] = (
+    "Солнце",
+    "Луна",
+    "Меркурий",
+    "Венера",
+    "Марс",
+    "Юпитер",
+    "Сатурн",
+    "Уран",
+    "Нептун",
+    "Плутон",
+)
+
+# Планеты для расчета транзитов: номер Swiss Ephemeris -> название
+TRANSIT_PLANETS: Dict[int, str] = dict(
+    zip(range(swe.SUN, swe.PLUTO + 1), PLANET_NAMES)
+)
+
 
 class TransitCalculator:
     """Калькулятор транзитов"""
 
     def __init__(self):
         # Планеты для расчета транзитов (исключаем Лилит и другие астероиды для базовой версии)
-        self.transit_planets = {
-            swe.SUN: "Солнце",
-            swe.MOON: "Луна",
-            swe.MERCURY: "Меркурий",
-            swe.VENUS: "Венера",
-            swe.MARS: "Марс",
-            swe.JUPITER: "Юпитер",
-            swe.SATURN: "Сатурн",
-            swe.URANUS: "Уран",
-            swe.NEPTUNE: "Нептун",
-            swe.PLUTO: "Плутон",
-        }
+        self.transit_planets = TRANSIT_PLANETS
 
         # Настройки аспектов для транзитов
         self.transit_aspects = {
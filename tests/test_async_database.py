@@ -3,9 +3,12 @@
 Проверяют корректность работы новой async реализации.
 """
 
+import asyncio
+from dataclasses import FrozenInstanceError
 from datetime import datetime, timedelta
 
 import pytest
+from sqlalchemy.exc import InvalidRequestError
 
 from database_async import (
     AsyncDatabaseManager,
@@ -13,6 +16,7 @@ from database_async import (
     Subscription,
     SubscriptionType,
     User,
+    db_session_context,
 )
 
 
@@ -250,6 +254,22 @@ class TestAsyncDatabaseManager:
         assert stats["new_users_today"] == 2  # Оба созданы сегодня
         assert stats["active_premium"] == 0  # Нет премиум подписок
 
+    async def test_create_user_without_on_conflict(self, test_db: AsyncDatabaseManager, monkeypatch):
+        """Тест создания пользователя на диалекте без INSERT ... ON CONFLICT"""
+        monkeypatch.setattr("database_async._DIALECT_INSERTS", {})
+
+        user, created = await test_db.get_or_create_user(12345, "Test User")
+        assert created is True
+        assert user.telegram_id == 12345
+
+        # Конфликт UNIQUE откатывает только SAVEPOINT, транзакция продолжается
+        async with db_session_context(test_db):
+            assert await test_db._insert_user_in_savepoint(12345, "Duplicate") is None
+            user2, created2 = await test_db.get_or_create_user(12345, "Duplicate")
+
+        assert created2 is False
+        assert user2.id == user.id
+
     async def test_notifications_setting(self, test_db: AsyncDatabaseManager):
         """Тест настройки уведомлений"""
         # Создаем пользователя
@@ -264,6 +284,90 @@ class TestAsyncDatabaseManager:
         updated_user = await test_db.get_user_profile(12345)
         assert updated_user.notifications_enabled is False
 
+    async def test_nested_calls_share_session(self, test_db: AsyncDatabaseManager):
+        """Тест: методы внутри db_session_context работают в одной сессии"""
+        await test_db.get_or_create_user(12345, "Test User")
+
+        async with db_session_context(test_db) as session:
+            await test_db.create_premium_subscription(12345, duration_days=30)
+            assert test_db._session is session
+            assert await test_db.cancel_premium_subscription(12345) is True
+
+        assert test_db._session is None
+        assert (await test_db.get_subscription_info(12345))["is_premium"] is False
+
+    async def test_task_spawned_in_session_context_uses_own_session(
+        self, test_db: AsyncDatabaseManager
+    ):
+        """Тест: задача, созданная внутри db_session_context, не берет сессию блока"""
+        await test_db.get_or_create_user(12345, "Test User")
+        release = asyncio.Event()
+
+        async def enable_premium_later():
+            await release.wait()
+            assert test_db._session is None
+            return await test_db.create_premium_subscription(12345, duration_days=30)
+
+        async with db_session_context(test_db) as session:
+            task = asyncio.create_task(enable_premium_later())
+            assert test_db._session is session
+
+        # Блок уже закрыл свою сессию — задача работает в собственной
+        release.set()
+        await task
+        assert (await test_db.get_subscription_info(12345))["is_premium"] is True
+
+    async def test_users_raise_on_lazy_load(self, test_db: AsyncDatabaseManager):
+        """Тест raiseload: неподгруженные связи пользователей не грузятся лениво"""
+        await test_db.get_or_create_user(12345, "Test User")
+
+        users, _ = await test_db.get_users_paginated()
+        assert users[0].subscription is None
+        with pytest.raises(InvalidRequestError):
+            users[0].natal_charts
+
+    async def test_profile_is_immutable_snapshot(self, test_db: AsyncDatabaseManager):
+        """Тест: профиль из кэша — неизменяемый снимок, а не ORM-объект"""
+        await test_db.get_or_create_user(12345, "Test User")
+
+        profile = await test_db.get_user_profile(12345)
+        assert not isinstance(profile, User)
+        assert profile.subscription is None
+        assert profile.is_premium is False
+        with pytest.raises(FrozenInstanceError):
+            profile.name = "Changed"
+
+    async def test_profile_and_subscription_cache(self, test_db: AsyncDatabaseManager):
+        """Тест кэша профиля и подписки со сбросом при изменениях"""
+        await test_db.get_or_create_user(12345, "Test User")
+        await test_db.get_or_create_subscription(12345)
+
+        profile = await test_db.get_user_profile(12345)
+        assert profile.subscription.subscription_type == "free"
+        assert await test_db.get_user_profile(12345) is profile
+        info = await test_db.get_subscription_info(12345)
+        assert info["is_premium"] is False
+
+        # Изменения через менеджер сбрасывают кэш пользователя
+        await test_db.set_notifications(12345, False)
+        assert (await test_db.get_user_profile(12345)).notifications_enabled is False
+
+        await test_db.create_premium_subscription(12345, duration_days=30)
+        assert (await test_db.get_subscription_info(12345))["is_premium"] is True
+
+        await test_db.revoke_premium_subscription(12345)
+        assert (await test_db.get_subscription_info(12345))["is_premium"] is False
+
+    async def test_created_subscription_resets_profile_cache(self, test_db: AsyncDatabaseManager):
+        """Тест: создание подписки сбрасывает закэшированный профиль"""
+        await test_db.get_or_create_user(12345, "Test User")
+        assert (await test_db.get_user_profile(12345)).subscription is None
+
+        await test_db.get_or_create_subscription(12345)
+        profile = await test_db.get_user_profile(12345)
+        assert profile.subscription is not None
+        assert profile.subscription.is_active is True
+
     async def test_cleanup_expired_predictions(self, test_db: AsyncDatabaseManager):
         """Тест очистки устаревших прогнозов"""
         # Создаем пользователя и карту
@@ -344,3 +448,16 @@ class TestAsyncDatabasePerformance:
         # Проверяем общее количество
         total_users = await test_db.get_total_users_count()
         assert total_users == 10
+
+    async def test_bulk_natal_chart_creation(
+        self, test_db: AsyncDatabaseManager, sample_user: User, sample_natal_charts
+    ):
+        """Тест пакетного создания натальных карт одним INSERT"""
+        chart_ids = await sample_natal_charts(25)
+
+        assert len(chart_ids) == 25
+        assert len(set(chart_ids)) == 25
+
+        charts = await test_db.get_user_charts(sample_user.telegram_id)
+        assert {chart.id for chart in charts} == set(chart_ids)
+        assert charts[0].get_planets_data()["Солнце"].sign == "Козерог"
@@ -1,13 +1,19 @@
+from datetime import datetime, timedelta
+
 import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import InvalidRequestError
 
-from database import DatabaseManager
+from database import DatabaseManager, Subscription, SubscriptionType, User
 
 
 # Фикстура для создания чистой базы данных для каждого теста
 @pytest.fixture
 def db_manager():
     """Создает экземпляр DatabaseManager с базой данных в памяти."""
-    manager = DatabaseManager(database_url="sqlite:///:memory:")
+    manager = DatabaseManager(
+        database_url="sqlite:///:memory:", strict_loading=True, debug=True
+    )
     # Base.metadata.create_all(manager.engine) # таблицы создаются в __init__
     return manager
 
@@ -65,3 +71,103 @@ def test_get_users_for_mailing(db_manager: DatabaseManager):
     mailing_ids = {user.telegram_id for user in mailing_list}
     assert mailing_ids == {1, 2, 4}
     assert 3 not in mailing_ids
+
+
+def test_strict_loading_raises_on_lazy_load(db_manager: DatabaseManager):
+    """Тест: в strict_loading ленивая загрузка связи падает, а lazy="joined" работает."""
+    db_manager.get_or_create_user(telegram_id=5, name="Strict")
+
+    with db_manager.get_read_session() as session:
+        user = session.execute(select(User)).scalars().one()
+        assert user.subscription is None  # lazy="joined" из маппера не затронут
+        with pytest.raises(InvalidRequestError):
+            user.natal_charts
+
+
+def test_get_user_profile_query_count(db_manager: DatabaseManager):
+    """Тест: профиль с подпиской читается одним запросом, без N+1."""
+    db_manager.get_or_create_user(telegram_id=6, name="Counter")
+
+    with db_manager.query_counter() as statements:
+        user = db_manager.get_user_profile(6)
+        assert user.is_premium is False
+
+    assert len(statements) == 1
+
+
+def test_detailed_statistics_served_from_snapshot(db_manager: DatabaseManager):
+    """Тест: статистика берется из свежего снимка, force_fresh пересчитывает ее."""
+    db_manager.get_or_create_user(telegram_id=7, name="First")
+    assert db_manager.get_detailed_statistics()["users"]["total"] == 1
+
+    db_manager.get_or_create_user(telegram_id=8, name="Second")
+    assert db_manager.get_detailed_statistics()["users"]["total"] == 1
+    assert db_manager.get_detailed_statistics(force_fresh=True)["users"]["total"] == 2
+
+
+def test_app_statistics_cached_until_subscription_change(db_manager: DatabaseManager):
+    """Тест: счетчики кэшируются и сбрасываются при изменении подписок."""
+    db_manager.get_or_create_user(telegram_id=9, name="Cached")
+    assert db_manager.get_app_statistics()["total_users"] == 1
+
+    db_manager.get_or_create_user(telegram_id=10, name="Hidden")
+    assert db_manager.get_app_statistics()["total_users"] == 1
+
+    db_manager.create_premium_subscription(telegram_id=10, duration_days=30)
+    stats = db_manager.get_app_statistics()
+    assert stats["total_users"] == 2
+    assert stats["active_premium"] == 1
+
+
+def test_user_id_cache_expires_after_external_delete(db_manager: DatabaseManager, monkeypatch):
+    """Тест: id пользователя, удаленного мимо менеджера, не живет в кэше дольше TTL."""
+    db_manager.get_or_create_user(telegram_id=11, name="Removed")
+    with db_manager.get_read_session() as session:
+        assert db_manager._get_user_id(session, 11) is not None
+
+    with db_manager.get_session() as session:
+        session.query(User).filter(User.telegram_id == 11).delete()
+        session.commit()
+
+    monkeypatch.setattr("database.USER_ID_CACHE_TTL", 0.0)
+    with db_manager.get_read_session() as session:
+        assert db_manager._get_user_id(session, 11) is None
+    assert 11 not in db_manager._user_ids
+
+
+def test_cleanup_and_expire_use_same_predicate(db_manager: DatabaseManager):
+    """Тест: cleanup_database и check_and_expire_subscriptions истекают одни и те же подписки."""
+    db_manager.get_or_create_user(telegram_id=12, name="Premium")
+    db_manager.create_premium_subscription(telegram_id=12, duration_days=30)
+    db_manager.get_or_create_user(telegram_id=13, name="Free")
+    db_manager.get_or_create_subscription(telegram_id=13)
+
+    with db_manager.get_session() as session:
+        session.query(Subscription).update(
+            {Subscription.end_date: datetime.utcnow() - timedelta(days=1)},
+            synchronize_session=False,
+        )
+        session.commit()
+
+    assert db_manager.cleanup_database()["subscriptions_expired"] == 1
+    assert db_manager.check_and_expire_subscriptions() == 0
+    assert db_manager.get_subscription_info(13)["type"] == SubscriptionType.FREE.value
+    assert db_manager.get_subscription_info(13)["status"] == "active"
+
+
+def test_users_paginated_keyset_skips_count(db_manager: DatabaseManager):
+    """Тест: страница по курсору читается без COUNT и возвращает следующий курсор."""
+    for telegram_id in range(20, 25):
+        db_manager.get_or_create_user(telegram_id=telegram_id, name=f"User {telegram_id}")
+
+    users, total_pages = db_manager.get_users_paginated(per_page=2)
+    assert total_pages == 3
+
+    with db_manager.query_counter() as statements:
+        next_users, cursor = db_manager.get_users_paginated(per_page=2, after_id=users[-1].id)
+    assert not any("count(" in statement.lower() for statement in statements)
+    assert cursor == next_users[-1].id
+
+    last_users, cursor = db_manager.get_users_paginated(per_page=2, after_id=cursor)
+    assert [user.telegram_id for user in last_users] == [24]
+    assert cursor is None
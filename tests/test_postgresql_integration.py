@@ -5,6 +5,7 @@
 import asyncio
 import os
 import pytest
+import pytest_asyncio
 import tempfile
 from datetime import datetime, timedelta
 from unittest.mock import patch
@@ -16,7 +17,7 @@ from database import User, NatalChart, Prediction, Subscription
 class TestPostgreSQLIntegration:
     """Тесты интеграции с PostgreSQL"""
     
-    @pytest.fixture
+    @pytest_asyncio.fixture
     async def postgresql_db(self):
         """Фикстура для PostgreSQL базы данных"""
         # Используем тестовую PostgreSQL базу данных
@@ -75,6 +75,7 @@ class TestSubscriptionService:
         assert status["is_premium"] is False
         assert status["is_active"] is True
 
+    @pytest.mark.asyncio
     @patch.object(SubscriptionService, "is_user_premium")
     async def test_filter_planets_for_premium_user(self, mock_is_premium):
         """Тест: фильтрация планет для премиум пользователя"""
@@ -95,6 +96,7 @@ class TestSubscriptionService:
         assert "Марс" in filtered
         assert "Венера" in filtered
 
+    @pytest.mark.asyncio
     @patch.object(SubscriptionService, "is_user_premium")
     async def test_filter_planets_for_free_user(self, mock_is_premium):
         """Тест: фильтрация планет для бесплатного пользователя"""